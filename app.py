@@ -4,13 +4,41 @@ import eventlet.debug
 eventlet.debug.hub_prevent_multiple_readers(False)
 
 import os
+import re
+import sys
+import glob
+import shutil
+import subprocess
+import time
+import traceback
+import json
+import heapq
+import uuid
+import hashlib
+import mimetypes
+import collections
+import eventlet.queue
+import eventlet.semaphore
+import eventlet.tpool
+import eventlet.patcher
+from eventlet.hubs import trampoline
 import psycopg2
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, make_response, jsonify
+import psycopg2.extensions
+import psycopg2.extras
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, make_response, jsonify, g, has_app_context
 from werkzeug.utils import secure_filename
-from pdf2image import convert_from_path
+from werkzeug.security import safe_join
+from urllib.parse import quote
+from werkzeug.exceptions import ClientDisconnected
+from pdf2image import convert_from_path, pdfinfo_from_path
+from PIL import Image, ImageOps, features
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from datetime import datetime, timezone, timedelta
 
 from flask_socketio import SocketIO, join_room, emit
+from socketio import PubSubManager
+
+from migrations import migrate
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your_fallback_secret_key')
@@ -19,48 +47,1110 @@ app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024 * 1024  # 10 GB
 
 UPLOAD_FOLDER = 'uploads/'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'mp4', 'mp3', 'pdf', 'docx', 'xlsx'}
+DEPARTMENTS = ['extc', 'it', 'mech', 'cs']
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
+# Prometheus metrics, served per process at /metrics.
+HTTP_REQUEST_SECONDS = Histogram('notice_http_request_duration_seconds', 'Time to build a response',
+                                 ['method', 'endpoint', 'status'])
+DB_QUERY_SECONDS = Histogram('notice_db_query_duration_seconds', 'Query execution time by calling function',
+                             ['site'], buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5))
+PDF_PAGES_CONVERTED = Counter('notice_pdf_pages_converted_total', 'PDF pages rendered to images')
+PDF_PAGE_SECONDS = Histogram('notice_pdf_page_seconds', 'Time to render one PDF page',
+                             buckets=(.1, .25, .5, 1, 2, 4, 8, 16, 32))
+VIDEO_TRANSCODE_SECONDS = Histogram('notice_video_transcode_seconds', 'Time to build the renditions of one video',
+                                    buckets=(1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800))
+UPLOAD_BYTES = Counter('notice_upload_bytes_total', 'Bytes received from admin uploads', ['method'])
+SOCKET_CLIENTS = Gauge('notice_socket_clients', 'Socket.IO clients connected to this process, per room', ['room'])
+SCHEDULER_LAG_SECONDS = Histogram('notice_scheduler_lag_seconds', 'Broadcast time minus scheduled_time',
+                                  buckets=(.01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300))
+
+OFFLOAD_SECONDS = Histogram('notice_offload_seconds', 'Blocking work run in the native thread pool', ['task'])
+OFFLOAD_IN_FLIGHT = Gauge('notice_offload_in_flight', 'Offloaded calls queued or running')
+HUB_BLOCKS = Counter('notice_hub_blocked_total', 'Times a greenlet held the eventlet hub past HUB_BLOCK_THRESHOLD')
+
+# Disk writes, unlinks, hashing and image encoding block the hub thread, and
+# with it every socket heartbeat and request, so they go through offload().
+eventlet.tpool.set_num_threads(int(os.getenv('OFFLOAD_THREADS', 20)))
+
+def offload(func, *args, **kwargs):
+    """Run a blocking call in eventlet's native thread pool and wait for it greenly."""
+    OFFLOAD_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        return eventlet.tpool.execute(func, *args, **kwargs)
+    finally:
+        OFFLOAD_IN_FLIGHT.dec()
+        OFFLOAD_SECONDS.labels(func.__name__).observe(time.perf_counter() - start)
+
+class TimedCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        frame = sys._getframe(1)
+        # Attribute helpers such as execute_values() to the function calling them.
+        while frame.f_back and frame.f_globals.get('__name__', '').startswith('psycopg2'):
+            frame = frame.f_back
+        code = frame.f_code
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            DB_QUERY_SECONDS.labels(getattr(code, 'co_qualname', code.co_name)).observe(time.perf_counter() - start)
+
+class PoolTimeout(Exception):
+    pass
+
+class PooledConnection:
+    """Proxy around a psycopg2 connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, conn, created):
+        self._pool = pool
+        self._conn = conn
+        self._created = created
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to pool")
+        return getattr(self._conn, name)
+
+    @property
+    def returned(self):
+        return self._conn is None
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.putconn(conn, self._created)
+
+class ConnectionPool:
+    """Bounded psycopg2 pool whose checkout waits on a green semaphore."""
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=5.0, max_age=1800.0, check_idle=30.0):
+        self.dsn = dsn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_idle = check_idle
+        self._slots = eventlet.semaphore.Semaphore(maxconn)
+        self._idle = collections.deque()  # (conn, created, last_used)
+        self._open = 0
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,
+            'connects': 0,
+            'recycled': 0,
+            'health_check_failures': 0,
+        }
+        for _ in range(minconn):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic(), time.monotonic()))
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, cursor_factory=TimedCursor)
+        self._open += 1
+        self._stats['connects'] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._open -= 1
+        self._stats['recycled'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _healthy(self, conn, created, last_used):
+        now = time.monotonic()
+        if conn.closed or now - created > self.max_age:
+            return False
+        if now - last_used > self.check_idle:
+            try:
+                c = conn.cursor()
+                c.execute("SELECT 1")
+                c.close()
+                conn.rollback()
+            except Exception:
+                self._stats['health_check_failures'] += 1
+                return False
+        return True
+
+    def getconn(self):
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            self._stats['waits'] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                self._stats['timeouts'] += 1
+                raise PoolTimeout("no database connection available after %.1fs" % self.timeout)
+            waited = time.monotonic() - start
+            self._stats['wait_seconds_total'] += waited
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], waited)
+        try:
+            while self._idle:
+                conn, created, last_used = self._idle.pop()
+                if self._healthy(conn, created, last_used):
+                    break
+                self._discard(conn)
+            else:
+                conn, created = self._connect(), time.monotonic()
+        except Exception:
+            self._slots.release()
+            raise
+        self._in_use += 1
+        self._stats['checkouts'] += 1
+        return PooledConnection(self, conn, created)
+
+    def putconn(self, conn, created):
+        self._in_use -= 1
+        try:
+            if conn.closed or time.monotonic() - created > self.max_age:
+                self._discard(conn)
+                return
+            if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    self._discard(conn)
+                    return
+            self._idle.append((conn, created, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        data = dict(self._stats)
+        data.update({
+            'size': self._open,
+            'max_size': self.maxconn,
+            'in_use': self._in_use,
+            'idle': len(self._idle),
+        })
+        return data
+
+db_pool = None
+
+def get_db_pool():
+    global db_pool
+    if db_pool is None:
+        DATABASE_URL = os.getenv('DATABASE_URL')
+        if not DATABASE_URL:
+            raise Exception("DATABASE_URL environment variable not set!")
+        db_pool = ConnectionPool(
+            DATABASE_URL,
+            minconn=int(os.getenv('DB_POOL_MIN', 1)),
+            maxconn=int(os.getenv('DB_POOL_MAX', 10)),
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            max_age=float(os.getenv('DB_POOL_MAX_AGE', 1800)),
+            check_idle=float(os.getenv('DB_POOL_CHECK_IDLE', 30)),
+        )
+    return db_pool
 
 def get_db_connection():
-    DATABASE_URL = os.getenv('DATABASE_URL')
-    if not DATABASE_URL:
-        raise Exception("DATABASE_URL environment variable not set!")
-    return psycopg2.connect(DATABASE_URL)
+    conn = get_db_pool().getconn()
+    if has_app_context():
+        g.setdefault('db_connections', []).append(conn)
+    return conn
+
+@app.teardown_appcontext
+def release_db_connections(exc):
+    # Routes that bail out early without conn.close() must not leak pool slots.
+    for conn in g.pop('db_connections', []):
+        conn.close()
+
+# Set when running several processes or nodes: 'postgres' (LISTEN/NOTIFY on
+# DATABASE_URL), a postgresql:// URL, or a redis:// URL. Also turns on
+# cross-process cache invalidation and scheduler leader election.
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+CLUSTERED = bool(SOCKETIO_MESSAGE_QUEUE)
+PROCESS_ID = uuid.uuid4().hex
+NOTIFY_PAYLOAD_LIMIT = 7000  # NOTIFY rejects payloads of 8000 bytes or more
+
+def listen_connection(dsn, channels):
+    """Open a dedicated autocommit connection LISTENing on channels."""
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    c = conn.cursor()
+    for channel in channels:
+        c.execute("LISTEN " + psycopg2.extensions.quote_ident(channel, conn))
+    return conn
+
+def iter_notifies(conn):
+    while True:
+        trampoline(conn, read=True)
+        conn.poll()
+        while conn.notifies:
+            yield conn.notifies.pop(0)
+
+class PostgresManager(PubSubManager):
+    """Socket.IO client manager that fans out emits through Postgres LISTEN/NOTIFY.
+
+    Messages too big for a NOTIFY payload are stored in socketio_messages
+    and only their id is sent.
+    """
+    name = 'postgres'
+
+    def __init__(self, dsn, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.dsn = dsn
+
+    def _publish(self, data):
+        payload = self.json.dumps(data)
+        conn = get_db_connection()
+        try:
+            c = conn.cursor()
+            if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+                c.execute("INSERT INTO socketio_messages (payload) VALUES (%s) RETURNING id", (payload,))
+                payload = self.json.dumps({'host_id': self.host_id, 'message_id': c.fetchone()[0]})
+            c.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _listen(self):
+        while True:
+            conn = None
+            try:
+                conn = listen_connection(self.dsn, [self.channel])
+                for notify in iter_notifies(conn):
+                    message = self.json.loads(notify.payload)
+                    if 'message_id' in message:
+                        if message['host_id'] == self.host_id:
+                            continue
+                        c = conn.cursor()
+                        c.execute("SELECT payload FROM socketio_messages WHERE id=%s", (message['message_id'],))
+                        row = c.fetchone()
+                        if row is None:
+                            continue
+                        message = row[0]
+                    yield message
+            except Exception as e:
+                print("Error in Socket.IO message queue listener:", e)
+                eventlet.sleep(1)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+if SOCKETIO_MESSAGE_QUEUE.startswith('postgres'):
+    queue_dsn = os.getenv('DATABASE_URL') if SOCKETIO_MESSAGE_QUEUE == 'postgres' else SOCKETIO_MESSAGE_QUEUE
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', client_manager=PostgresManager(queue_dsn))
+elif SOCKETIO_MESSAGE_QUEUE:
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet', message_queue=SOCKETIO_MESSAGE_QUEUE)
+else:
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
+
+def cluster_notify(channel, message):
+    """Tell the other processes about a local change; no-op when not clustered."""
+    if not CLUSTERED:
+        return
+    try:
+        conn = get_db_connection()
+        try:
+            c = conn.cursor()
+            c.execute("SELECT pg_notify(%s, %s)", (channel, PROCESS_ID + ' ' + message))
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception as e:
+        print(e)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    if 'request_start' in g:
+        HTTP_REQUEST_SECONDS.labels(request.method, request.endpoint or 'unmatched',
+                                    response.status_code).observe(time.perf_counter() - g.request_start)
+    return response
 
 def init_db():
     conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS notices (
-            id SERIAL PRIMARY KEY,
-            department TEXT NOT NULL,
-            filename TEXT NOT NULL,
-            filetype TEXT NOT NULL,
-            scheduled_time TIMESTAMP NULL,
-            expire_time TIMESTAMP,
-            broadcasted BOOLEAN NOT NULL DEFAULT false
-        )
-    ''')
-    c.execute("ALTER TABLE notices ADD COLUMN IF NOT EXISTS expire_time TIMESTAMP NOT NULL DEFAULT (NOW() + INTERVAL '30 days')")
-    c.execute("ALTER TABLE notices ADD COLUMN IF NOT EXISTS broadcasted BOOLEAN NOT NULL DEFAULT false")
-    conn.commit()
-    conn.close()
+    try:
+        applied = migrate(conn)
+        if applied:
+            print("Applied schema migrations:", applied)
+    finally:
+        conn.close()
 
 init_db()
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# '' serves bytes from Flask, 'x-accel' hands them to nginx via X-Accel-Redirect,
+# 'x-sendfile' to Apache/lighttpd via X-Sendfile.
+MEDIA_OFFLOAD = os.getenv('MEDIA_OFFLOAD', '').lower()
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-uploads/')
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+app.config['USE_X_SENDFILE'] = MEDIA_OFFLOAD == 'x-sendfile'
+# filename -> (mtime_ns, size, sha256 hex) so each legacy file is hashed once per process.
+media_digests = {}
+# Blobs are stored as <sha256>.<ext>, and everything derived from one as <sha256>.<ext>.<...>.
+BLOB_NAME = re.compile(r'^([0-9a-f]{64})\.')
+
+def hash_file(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                break
+            sha256.update(block)
+    return sha256.hexdigest()
+
+def file_sha256(path):
+    return offload(hash_file, path)
+
+def media_digest(filename):
+    # Blob names already carry their hash, and derived files are versioned by
+    # their blob's; only files saved before the blob store are hashed.
+    match = BLOB_NAME.match(filename)
+    if match:
+        return match.group(1)
+    path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    cached = media_digests.get(filename)
+    if cached and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    media_digests[filename] = (st.st_mtime_ns, st.st_size, file_sha256(path))
+    return media_digests[filename][2]
+
+@app.template_global()
+def media_url(filename, size=None, name=None):
+    # The content hash in the query string lets clients cache the URL forever.
+    # Renditions are derived from the original, so its hash versions them too.
+    url = '/uploads/' + quote(filename)
+    params = []
+    if size:
+        params.append('size=' + size)
+    if name:
+        params.append('name=' + quote(name))
+    digest = media_digest(filename)
+    if digest:
+        params.append('v=' + digest[:16])
+    if params:
+        url += '?' + '&'.join(params)
+    return url
+
+IMAGE_FILETYPES = {'png', 'jpg', 'jpeg', 'gif', 'pdf_image'}
+# Documents are downloaded rather than shown, under the name they were uploaded with.
+DOWNLOAD_FILETYPES = {'docx', 'xlsx'}
+# name -> bounding box; thumbnails for the admin listing, the rest for displays.
+RENDITION_SIZES = {
+    'thumb': (320, 320),
+    '720': (1280, 720),
+    '1080': (1920, 1080),
+}
+# Best first; the route picks the first one the client's Accept header allows.
+RENDITION_FORMATS = [fmt for fmt in ('avif', 'webp') if features.check(fmt)] + ['jpg']
+RENDITION_MIMETYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpg': 'image/jpeg'}
+PIL_FORMATS = {'avif': 'AVIF', 'webp': 'WEBP', 'jpg': 'JPEG'}
+RENDITION_WORKERS = int(os.getenv('RENDITION_WORKERS', 2))
+rendition_queue = eventlet.queue.LightQueue()
+
+def rendition_filename(filename, size, fmt):
+    return f"{filename}.{size}.{fmt}"
+
+def build_renditions(filename):
+    """Write every size/format rendition of an uploaded image; runs in a native thread."""
+    path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    renditions = {}
+    with Image.open(path) as im:
+        if getattr(im, 'is_animated', False):
+            # Resizing would drop the animation; animated GIFs are served as uploaded.
+            return renditions
+        im = ImageOps.exif_transpose(im)
+        if im.mode in ('RGBA', 'LA', 'P'):
+            im = im.convert('RGBA')
+            flattened = Image.new('RGB', im.size, (255, 255, 255))
+            flattened.paste(im, mask=im.getchannel('A'))
+            im = flattened
+        elif im.mode != 'RGB':
+            im = im.convert('RGB')
+        for size, box in RENDITION_SIZES.items():
+            resized = im.copy()
+            resized.thumbnail(box, Image.LANCZOS)
+            for fmt in RENDITION_FORMATS:
+                out = os.path.join(app.config['UPLOAD_FOLDER'], rendition_filename(filename, size, fmt))
+                resized.save(out, PIL_FORMATS[fmt], quality=80)
+            renditions[size] = list(RENDITION_FORMATS)
+    return renditions
+
+def rendition_worker():
+    while True:
+        filename = rendition_queue.get()
+        try:
+            renditions = offload(build_renditions, filename)
+            conn = get_db_connection()
+            try:
+                c = conn.cursor()
+                # Holding the blob row serializes this with acquire_blob() re-adding the same content.
+                c.execute("SELECT 1 FROM blobs WHERE filename=%s FOR UPDATE", (filename,))
+                # Every notice sharing the blob (e.g. one per department) gets them.
+                c.execute("UPDATE notices SET renditions=%s WHERE filename=%s RETURNING id, department",
+                          (json.dumps(renditions), filename))
+                updated = c.fetchall()
+                if not updated:
+                    # The blob was released while we rendered and release_blobs() already
+                    # removed the original; don't leave renditions behind.
+                    offload(remove_derived_files, filename)
+                conn.commit()
+            finally:
+                conn.close()
+            if renditions:
+                for notice_id, dept in updated:
+                    socketio.emit('notice_renditions', {'id': notice_id, 'renditions': renditions}, room=dept)
+                for dept in {dept for notice_id, dept in updated}:
+                    notice_cache.invalidate(dept)
+        except Exception as e:
+            print("Error building renditions for", filename, e)
+
+def remove_derived_files(filename):
+    # Image renditions, video renditions, HLS segments and posters are all <filename>.<...>.
+    for path in glob.glob(os.path.join(glob.escape(app.config['UPLOAD_FOLDER']), glob.escape(filename) + '.*')):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def remove_notice_files(filename):
+    try:
+        os.remove(os.path.join(app.config['UPLOAD_FOLDER'], filename))
+    except Exception as e:
+        print(e)
+    remove_derived_files(filename)
+
+# Uploaded content is stored once per SHA-256 as UPLOAD_FOLDER/<sha256>.<ext>;
+# notices name the blob file and the blobs table counts them.
+
+def copy_and_hash(stream, path):
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            block = stream.read(STREAM_BUFFER_SIZE)
+            if not block:
+                break
+            f.write(block)
+            sha256.update(block)
+            size += len(block)
+    return sha256.hexdigest(), size
+
+def stage_upload(stream):
+    """Copy an upload stream into a temporary file in UPLOAD_FOLDER, hashing it on the way."""
+    path = os.path.join(app.config['UPLOAD_FOLDER'], uuid.uuid4().hex + '.part')
+    # Form uploads are already spooled to memory or disk by Werkzeug, so the
+    # whole copy can run off the hub.
+    digest, size = offload(copy_and_hash, stream, path)
+    return {'path': path, 'sha256': digest, 'size': size}
+
+def stage_file(path):
+    return {'path': path, 'sha256': file_sha256(path), 'size': os.path.getsize(path)}
+
+def acquire_blob(c, staged, ext, references=1):
+    """Add references to the blob with staged's content and return the blob's filename.
+
+    Run in the transaction that inserts the referencing notices. The staged
+    file becomes the blob, or is dropped if the content is already stored.
+    """
+    c.execute("""
+        INSERT INTO blobs (sha256, filename, size, refcount) VALUES (%s, %s, %s, %s)
+        ON CONFLICT (sha256) DO UPDATE SET refcount = blobs.refcount + EXCLUDED.refcount
+        RETURNING filename
+    """, (staged['sha256'], f"{staged['sha256']}.{ext}", staged['size'], references))
+    filename = c.fetchone()[0]
+    path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    # release_blobs() unlinks while holding the blob row, so once the upsert
+    # above returns, an existing file is guaranteed to stay.
+    if os.path.exists(path):
+        offload(os.remove, staged['path'])
+    else:
+        offload(os.replace, staged['path'], path)
+    return filename
+
+def release_blobs(c, filenames):
+    """Drop one reference per entry in filenames, unlinking files nothing uses any more.
+
+    Run in the transaction that deleted the notices, before it commits.
+    """
+    c.execute("""
+        UPDATE blobs SET refcount = blobs.refcount - released.n
+        FROM (SELECT filename, COUNT(*) AS n FROM unnest(%s::text[]) AS filename GROUP BY filename) AS released
+        WHERE blobs.filename = released.filename
+        RETURNING blobs.filename, blobs.refcount
+    """, (list(filenames),))
+    rows = c.fetchall()
+    orphaned = [filename for filename, refcount in rows if refcount <= 0]
+    if orphaned:
+        c.execute("DELETE FROM blobs WHERE filename = ANY(%s)", (orphaned,))
+    # Files saved before the blob store existed go once no notice names them.
+    tracked = {filename for filename, refcount in rows}
+    legacy = list(set(filenames) - tracked)
+    if legacy:
+        c.execute("SELECT DISTINCT filename FROM notices WHERE filename = ANY(%s)", (legacy,))
+        in_use = {row[0] for row in c.fetchall()}
+        orphaned += [filename for filename in legacy if filename not in in_use]
+    for filename in orphaned:
+        offload(remove_notice_files, filename)
+    return orphaned
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+def parse_scheduled_time(date_str, time_str, ampm):
+    naive_dt = datetime.strptime(f"{date_str} {time_str} {ampm}", "%Y-%m-%d %I:%M %p")
+    return naive_dt.replace(tzinfo=IST).astimezone(timezone.utc)
+
+def parse_expire_date(expire_date_str, default):
+    # Notices expire at the end of the chosen IST day.
+    if expire_date_str and expire_date_str.strip() != "":
+        expire_dt = datetime.strptime(expire_date_str, "%Y-%m-%d")
+        return expire_dt.replace(hour=23, minute=59, second=59, tzinfo=IST).astimezone(timezone.utc)
+    return default
+
+def video_media(filename, renditions):
+    """Poster and <source> list for a video notice, best first; the original is always last."""
+    sources = []
+    if 'hls' in renditions:
+        sources.append({'src': media_url(rendition_filename(filename, 'hls', 'm3u8')),
+                        'type': 'application/vnd.apple.mpegurl'})
+    if '720' in renditions:
+        sources.append({'src': media_url(rendition_filename(filename, '720', 'mp4')), 'type': 'video/mp4'})
+    sources.append({'src': media_url(filename), 'type': 'video/mp4'})
+    poster = media_url(rendition_filename(filename, 'poster', 'jpg')) if 'poster' in renditions else None
+    return {'sources': sources, 'poster': poster}
+
+# Every query that feeds notice_payload() selects (or returns) these, in this order.
+NOTICE_COLUMNS = ("id, department, filename, filetype, scheduled_time, expire_time, renditions, document_id, document_name, "
+                  "original_name")
+
+def notice_payload(row):
+    """The JSON shape of a notice for feeds, socket events and the admin listing."""
+    (n_id, dept, filename, filetype, scheduled_time, expire_time, renditions, document_id, document_name,
+     original_name) = row
+    payload = {
+        'id': n_id,
+        'department': dept,
+        'filename': filename,
+        'filetype': filetype,
+        'original_name': original_name,
+        'url': media_url(filename, name=original_name if filetype in DOWNLOAD_FILETYPES else None),
+        'scheduled_time': scheduled_time.strftime("%Y-%m-%d %H:%M:%S") if scheduled_time else None,
+        'expire_time': expire_time.strftime("%Y-%m-%d %H:%M:%S") if expire_time else None,
+        'renditions': renditions,
+        'document_id': document_id,
+        'document_name': document_name
+    }
+    if filetype == 'mp4':
+        payload.update(video_media(filename, renditions))
+    return payload
+
+def manifest_item(payload):
+    # What the slideshow will actually fetch for this slide, so clients can preload it.
+    item = {'id': payload['id'], 'filename': payload['filename'], 'type': payload['filetype'], 'src': payload['url']}
+    if payload['filetype'] in IMAGE_FILETYPES:
+        item['src'] = media_url(payload['filename'], '1080')
+        item['srcset'] = f"{media_url(payload['filename'], '720')} 1280w, {item['src']} 1920w"
+    elif payload['filetype'] == 'mp4':
+        # The capped MP4 rather than the playlist: it is what a prefetch can actually warm.
+        item['src'] = next((s['src'] for s in payload['sources'] if s['type'] == 'video/mp4'), payload['url'])
+        item['poster'] = payload['poster']
+    return item
+
+NOTICE_CHANGE_RETENTION_DAYS = 7
+
+def record_notice_changes(c, dept, change, notice_ids):
+    """Bump dept's revision and log notice_ids as 'add' or 'remove'.
+
+    Must run on the cursor of the transaction that made the change.
+    """
+    c.execute("""
+        INSERT INTO department_revisions (department, revision) VALUES (%s, 1)
+        ON CONFLICT (department) DO UPDATE SET revision = department_revisions.revision + 1
+        RETURNING revision
+    """, (dept,))
+    revision = c.fetchone()[0]
+    c.execute("""
+        INSERT INTO notice_changes (department, revision, notice_id, change)
+        SELECT %s, %s, unnest(%s::integer[]), %s
+    """, (dept, revision, list(notice_ids), change))
+    return revision
+
+def prune_notice_changes():
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute("""
+            WITH pruned AS (
+                DELETE FROM notice_changes
+                WHERE created_at < NOW() - %s * INTERVAL '1 day'
+                RETURNING department, revision
+            )
+            UPDATE department_revisions d
+            SET pruned_through = GREATEST(d.pruned_through, p.max_revision)
+            FROM (SELECT department, MAX(revision) AS max_revision FROM pruned GROUP BY department) p
+            WHERE d.department = p.department
+        """, (NOTICE_CHANGE_RETENTION_DAYS,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def blob_renditions(c, filename):
+    # A duplicate upload reuses the renditions already built for its blob.
+    c.execute("""
+        SELECT renditions FROM notices
+        WHERE filename=%s AND renditions <> '{}'::jsonb
+        LIMIT 1
+    """, (filename,))
+    row = c.fetchone()
+    return row[0] if row else {}
+
+def create_notices(depts, staged, filetype, scheduled_time, expire_time, document=None, renditions=None,
+                   original_name=None, job_id=None):
+    """Publish one staged file to every department in depts and return the notice payloads.
+
+    All rows go in with a single INSERT, and the file is stored and rendered once.
+    document is (id, name) of the PDF a page came from; renditions, if given,
+    were already built for the file (transcoded videos); original_name is
+    the uploaded filename, kept for display and downloads. With job_id the
+    notices are recorded on that job in the same transaction, so a resumed
+    job never publishes a page twice.
+    """
+    if not depts:
+        # Nothing would reference the blob, so it would sit on disk at refcount 0.
+        raise ValueError("No departments to publish to.")
+    document_id, document_name = document or (None, None)
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        if job_id:
+            c.execute("SELECT 1 FROM jobs WHERE id=%s AND owner=%s FOR UPDATE", (job_id, PROCESS_ID))
+            if c.fetchone() is None:
+                raise Exception("Job was taken over by another worker.")
+        filename = acquire_blob(c, staged, 'jpg' if filetype == 'pdf_image' else filetype, references=len(depts))
+        if not renditions:
+            renditions = blob_renditions(c, filename)
+        rows = psycopg2.extras.execute_values(c, f"""
+            INSERT INTO notices (department, filename, filetype, scheduled_time, expire_time, renditions,
+                                 document_id, document_name, original_name)
+            VALUES %s
+            RETURNING {NOTICE_COLUMNS}
+        """, [(dept, filename, filetype, scheduled_time, expire_time, json.dumps(renditions), document_id, document_name,
+               original_name)
+              for dept in depts],
+            fetch=True)
+        revisions = {}
+        if not scheduled_time:
+            # Scheduled notices enter the feed when process_due_notices() publishes them.
+            for row in rows:
+                revisions[row[1]] = record_notice_changes(c, row[1], 'add', [row[0]])
+        if job_id:
+            c.execute("""
+                UPDATE jobs SET pages_done = pages_done + 1, notice_ids = notice_ids || %s, updated_at = NOW()
+                WHERE id=%s
+            """, ([row[0] for row in rows], job_id))
+        conn.commit()
+    finally:
+        conn.close()
+    for dept in depts:
+        notice_cache.invalidate(dept)
+    notice_scheduler.wake()
+    if filetype in IMAGE_FILETYPES and not renditions:
+        rendition_queue.put(filename)
+    created = []
+    for row in rows:
+        notice_data = notice_payload(row)
+        dept = notice_data['department']
+        if dept in revisions:
+            notice_data['revision'] = revisions[dept]
+        # emitted_at lets a client measure delivery lag on its own clock.
+        socketio.emit('new_prescheduled_notice' if scheduled_time else 'new_notice',
+                      dict(notice_data, emitted_at=time.time()), room=dept)
+        created.append(notice_data)
+    return created
+
+def target_departments(dept, requested):
+    """The uploader's department plus any other departments picked for a broadcast."""
+    return [dept] + [d for d in DEPARTMENTS if d != dept and d in requested]
+
+def publish_upload(dept, staged, filename, scheduled_time, expire_time, depts=None):
+    """Turn a staged upload into notices for depts (default: dept) and return a status message."""
+    depts = depts or [dept]
+    file_extension = filename.rsplit('.', 1)[1].lower()
+    if file_extension == 'pdf':
+        enqueue_job('pdf', dept, staged, filename, scheduled_time, expire_time, depts)
+        if scheduled_time:
+            return 'PDF uploaded. Pages will be scheduled as they are converted.'
+        return 'PDF uploaded. Pages will appear as they are converted.'
+    if file_extension == 'mp4' and FFMPEG:
+        enqueue_job('video', dept, staged, filename, scheduled_time, expire_time, depts)
+        if scheduled_time:
+            return 'Video uploaded. It will be scheduled once it has been transcoded.'
+        return 'Video uploaded. It will appear once it has been transcoded.'
+    create_notices(depts, staged, file_extension, scheduled_time, expire_time, original_name=filename)
+    if scheduled_time:
+        return 'Notice scheduled successfully.'
+    return 'File uploaded successfully.'
+
+NOTICE_CACHE_MAX_AGE = float(os.getenv('NOTICE_CACHE_MAX_AGE', 300))
+
+class NoticeCache:
+    """Active notices per department, valid until the next schedule/expiry boundary."""
+
+    def __init__(self, max_age=NOTICE_CACHE_MAX_AGE):
+        self.max_age = max_age
+        self._entries = {}
+        self._versions = collections.defaultdict(int)
+        self._locks = collections.defaultdict(eventlet.semaphore.Semaphore)
+
+    def invalidate(self, dept, broadcast=True):
+        self._versions[dept] += 1
+        self._entries.pop(dept, None)
+        if broadcast:
+            cluster_notify('notice_cache', dept)
+
+    def get(self, dept):
+        entry = self._entries.get(dept)
+        if entry and time.monotonic() < entry['valid_until']:
+            return entry
+        with self._locks[dept]:
+            entry = self._entries.get(dept)
+            if entry and time.monotonic() < entry['valid_until']:
+                return entry
+            version = self._versions[dept]
+            entry = self._load(dept)
+            if version == self._versions[dept]:
+                self._entries[dept] = entry
+            return entry
+
+    def _load(self, dept):
+        conn = get_db_connection()
+        try:
+            c = conn.cursor()
+            # Read the revision first: the list below can only be newer, and
+            # replaying a change a client already has is harmless.
+            c.execute("SELECT revision FROM department_revisions WHERE department=%s", (dept,))
+            row = c.fetchone()
+            revision = row[0] if row else 0
+            c.execute(f"""
+                SELECT {NOTICE_COLUMNS}
+                FROM notices
+                WHERE department=%s
+                AND (scheduled_time IS NULL OR scheduled_time <= NOW())
+                AND expire_time > NOW()
+                ORDER BY id DESC
+            """, (dept,))
+            notices = c.fetchall()
+            c.execute("""
+                SELECT EXTRACT(EPOCH FROM (LEAST(
+                    (SELECT MIN(scheduled_time) FROM notices
+                     WHERE department=%s AND scheduled_time > NOW()),
+                    (SELECT MIN(expire_time) FROM notices
+                     WHERE department=%s AND expire_time > NOW())
+                ) - NOW()))
+            """, (dept, dept))
+            seconds_to_boundary = c.fetchone()[0]
+        finally:
+            conn.close()
+        ttl = self.max_age
+        if seconds_to_boundary is not None:
+            ttl = min(ttl, max(float(seconds_to_boundary), 0))
+        payloads = [notice_payload(n) for n in notices]
+        manifest = {'revision': revision, 'media': [manifest_item(p) for p in payloads]}
+        return {
+            'notices': notices,
+            'payloads': payloads,
+            'revision': revision,
+            'json': json.dumps(payloads),
+            'manifest': json.dumps(manifest, separators=(',', ':')),
+            'html': None,
+            'etags': {},
+            'valid_until': time.monotonic() + ttl
+        }
+
+def cached_notice_response(entry, key, mimetype):
+    """Serve a cached body (json, manifest or html) with a strong ETag so unchanged polls get a 304."""
+    body = entry[key]
+    etag = entry['etags'].get(key)
+    if etag is None:
+        etag = entry['etags'][key] = hashlib.sha256(body.encode()).hexdigest()[:32]
+    response = app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Notice-Revision'] = str(entry['revision'])
+    return response.make_conditional(request)
+
+notice_cache = NoticeCache()
+
+# PDF and video conversions are rows in the jobs table rather than process
+# memory, so every worker can report on them and a restart resumes them.
+JOB_STALE_SECONDS = float(os.getenv('JOB_STALE_SECONDS', 120))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 30))
+JOB_MAX_ATTEMPTS = 3
+JOB_RETENTION_DAYS = 7
+MAX_LISTED_JOBS = 200
+JOB_COLUMNS = "id, kind, department, departments, filename, status, pages_total, pages_done, notice_ids, error, created_at"
+job_wakeups = {'pdf': eventlet.queue.LightQueue(), 'video': eventlet.queue.LightQueue()}
+# Ids of the jobs this process is working on, kept fresh by job_heartbeat().
+running_jobs = set()
+
+def job_payload(row):
+    job = dict(zip(('id', 'kind', 'department', 'departments', 'filename', 'status', 'pages_total', 'pages_done',
+                    'notice_ids', 'error'), row[:10]))
+    job['created'] = row[10].strftime("%Y-%m-%d %H:%M:%S")
+    return job
+
+def enqueue_job(kind, dept, staged, filename, scheduled_time, expire_time, depts):
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute(f"""
+            INSERT INTO jobs (id, kind, department, departments, filename, staged_path, sha256, size,
+                              scheduled_time, expire_time)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING {JOB_COLUMNS}
+        """, (uuid.uuid4().hex, kind, dept, depts, filename, staged['path'], staged['sha256'], staged['size'],
+              scheduled_time, expire_time))
+        job = job_payload(c.fetchone())
+        conn.commit()
+    finally:
+        conn.close()
+    job_wakeups[kind].put(None)
+    return job
+
+def claim_job(kind):
+    """Take the oldest queued job of kind, or a running one whose owner stopped heartbeating."""
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute(f"""
+            UPDATE jobs SET status = 'running', owner = %s, attempts = attempts + 1, updated_at = NOW()
+            WHERE id = (
+                SELECT id FROM jobs
+                WHERE kind = %s AND status IN ('queued', 'running') AND attempts < %s
+                AND (status = 'queued' OR updated_at < NOW() - %s * INTERVAL '1 second')
+                ORDER BY created_at
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING {JOB_COLUMNS}, staged_path, sha256, size, scheduled_time, expire_time
+        """, (PROCESS_ID, kind, JOB_MAX_ATTEMPTS, JOB_STALE_SECONDS))
+        row = c.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    staged = {'path': row[11], 'sha256': row[12], 'size': row[13]}
+    return job_payload(row[:11]), staged, row[14], row[15]
+
+def emit_job(job):
+    socketio.emit(f"{job['kind']}_job_progress", job, room=job['department'])
+
+def update_job(job, **fields):
+    """Save fields on a job this process still owns and emit it; False if another worker took it over."""
+    job.update(fields)
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        assignments = ', '.join(f"{name} = %s" for name in fields)
+        c.execute(f"UPDATE jobs SET {assignments}, updated_at = NOW() WHERE id = %s AND owner = %s",
+                  (*fields.values(), job['id'], PROCESS_ID))
+        updated = c.rowcount == 1
+        conn.commit()
+    finally:
+        conn.close()
+    if updated:
+        emit_job(job)
+    return updated
+
+def remove_job_files(job_id, staged_path=None):
+    """Remove PDF pages rendered for job_id but not published, and its staged upload."""
+    paths = glob.glob(os.path.join(app.config['UPLOAD_FOLDER'], job_id + '.page*'))
+    if staged_path:
+        paths.append(staged_path)
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(e)
+
+def job_worker(kind, run):
+    while True:
+        try:
+            claimed = claim_job(kind)
+        except Exception as e:
+            print("Error claiming job:", e)
+            claimed = None
+        if claimed is None:
+            try:
+                job_wakeups[kind].get(timeout=JOB_POLL_SECONDS)
+            except eventlet.queue.Empty:
+                pass
+            continue
+        job, staged, scheduled_time, expire_time = claimed
+        running_jobs.add(job['id'])
+        try:
+            run(job, staged, scheduled_time, expire_time)
+            fields = {'status': 'done', 'error': job['error']}
+        except Exception as e:
+            print(f"Error in {kind} job:", e)
+            fields = {'status': 'failed', 'error': str(e)}
+        try:
+            finished = update_job(job, **fields)
+        except Exception as e:
+            # Still marked running, so it is claimed again once the heartbeat stops.
+            print(e)
+            finished = False
+        finally:
+            running_jobs.discard(job['id'])
+        if finished:
+            offload(remove_job_files, job['id'], staged['path'])
+
+def job_heartbeat():
+    while True:
+        eventlet.sleep(JOB_STALE_SECONDS / 4)
+        if not running_jobs:
+            continue
+        try:
+            conn = get_db_connection()
+            try:
+                c = conn.cursor()
+                c.execute("UPDATE jobs SET updated_at = NOW() WHERE id = ANY(%s) AND owner = %s",
+                          (list(running_jobs), PROCESS_ID))
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            print("Error in job heartbeat:", e)
+
+def prune_jobs():
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        # Out of attempts: each claim ended with its worker process dying.
+        c.execute("""
+            UPDATE jobs SET status = 'failed', error = 'Abandoned after repeated restarts.', updated_at = NOW()
+            WHERE status = 'running' AND attempts >= %s AND updated_at < NOW() - %s * INTERVAL '1 second'
+        """, (JOB_MAX_ATTEMPTS, JOB_STALE_SECONDS))
+        c.execute("""
+            DELETE FROM jobs
+            WHERE status IN ('done', 'failed') AND updated_at < NOW() - %s * INTERVAL '1 day'
+        """, (JOB_RETENTION_DAYS,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def list_jobs(kind, dept):
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT {JOB_COLUMNS} FROM jobs
+            WHERE kind = %s AND department = %s
+            ORDER BY created_at DESC
+            LIMIT %s
+        """, (kind, dept, MAX_LISTED_JOBS))
+        rows = c.fetchall()
+    finally:
+        conn.close()
+    return [job_payload(row) for row in reversed(rows)]
+
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', 2))
+PDF_DPI = 200
+PDF_CHUNK_PAGES = int(os.getenv('PDF_CHUNK_PAGES', 8))
+
+def run_pdf_job(job, staged, scheduled_time, expire_time):
+    # pdftoppm renders a chunk of pages per call straight to JPEG files, so
+    # neither the whole document nor any PIL image is ever held in this
+    # process. A resumed job carries on after its last published page.
+    file_path = staged['path']
+    offload(remove_job_files, job['id'])
+    update_job(job, pages_total=job['pages_total'] or pdfinfo_from_path(file_path)['Pages'])
+    for first_page in range(job['pages_done'] + 1, job['pages_total'] + 1, PDF_CHUNK_PAGES):
+        start = time.perf_counter()
+        page_paths = convert_from_path(file_path, dpi=PDF_DPI, first_page=first_page,
+                                       last_page=min(first_page + PDF_CHUNK_PAGES - 1, job['pages_total']),
+                                       fmt='jpeg', output_folder=app.config['UPLOAD_FOLDER'],
+                                       output_file=job['id'] + '.page', paths_only=True)
+        page_seconds = (time.perf_counter() - start) / max(len(page_paths), 1)
+        for page_path in page_paths:
+            PDF_PAGE_SECONDS.observe(page_seconds)
+            PDF_PAGES_CONVERTED.inc()
+            created = create_notices(job['departments'], stage_file(page_path), 'pdf_image', scheduled_time,
+                                     expire_time, (job['id'], job['filename']), job_id=job['id'])
+            job['notice_ids'].extend(notice_data['id'] for notice_data in created)
+            job['pages_done'] += 1
+            emit_job(job)
+
+# Optional: with a local ffmpeg, mp4 uploads are transcoded before they are
+# published into a bitrate-capped 720p MP4, an HLS playlist cut from it and a
+# poster frame, all named <blob>.<rendition>.<ext> next to the original.
+FFMPEG = shutil.which(os.getenv('FFMPEG', 'ffmpeg'))
+VIDEO_WORKERS = int(os.getenv('VIDEO_WORKERS', 1))
+VIDEO_MAX_KBPS = int(os.getenv('VIDEO_MAX_KBPS', 2500))
+HLS_SEGMENT_SECONDS = 4
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+
+def run_ffmpeg(*args):
+    # subprocess is green under monkey_patch, so waiting on ffmpeg doesn't block the hub.
+    result = subprocess.run([FFMPEG, '-nostdin', '-y', '-v', 'error', *args], capture_output=True)
+    if result.returncode != 0:
+        raise Exception(f"ffmpeg exited with {result.returncode}: {result.stderr.decode(errors='replace')[-500:]}")
+
+def transcode_video(src, filename):
+    """Build the poster, 720p MP4 and HLS renditions of src for blob filename."""
+    def out(size, fmt):
+        return os.path.join(app.config['UPLOAD_FOLDER'], rendition_filename(filename, size, fmt))
+    run_ffmpeg('-i', src, '-vf', 'thumbnail,scale=min(1280\\,iw):-2', '-frames:v', '1', out('poster', 'jpg'))
+    # Keyframes on the segment boundary let the HLS cut be a plain stream copy.
+    run_ffmpeg('-i', src, '-vf', 'scale=-2:min(720\\,ih)',
+               '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p',
+               '-maxrate', f'{VIDEO_MAX_KBPS}k', '-bufsize', f'{VIDEO_MAX_KBPS * 2}k',
+               '-force_key_frames', f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})',
+               '-c:a', 'aac', '-b:a', '128k', '-movflags', '+faststart', out('720', 'mp4'))
+    run_ffmpeg('-i', out('720', 'mp4'), '-c', 'copy', '-f', 'hls',
+               '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_playlist_type', 'vod',
+               '-hls_segment_filename', out('hls', '%03d.ts'), out('hls', 'm3u8'))
+    return {'720': ['mp4'], 'hls': ['m3u8'], 'poster': ['jpg']}
+
+def run_video_job(job, staged, scheduled_time, expire_time):
+    if job['notice_ids']:
+        # Published before a restart cut the job short.
+        return
+    emit_job(job)
+    # Outputs are named after the blob the upload will be stored as.
+    filename = f"{staged['sha256']}.mp4"
+    conn = get_db_connection()
+    try:
+        renditions = blob_renditions(conn.cursor(), filename)
+    finally:
+        conn.close()
+    if not renditions:
+        start = time.perf_counter()
+        try:
+            renditions = transcode_video(staged['path'], filename)
+            VIDEO_TRANSCODE_SECONDS.observe(time.perf_counter() - start)
+        except Exception as e:
+            # Publish the original rather than lose the notice.
+            print("Error transcoding video:", e)
+            job['error'] = str(e)
+            offload(remove_derived_files, filename)
+            renditions = {}
+    created = create_notices(job['departments'], staged, 'mp4', scheduled_time, expire_time, renditions=renditions,
+                             original_name=job['filename'], job_id=job['id'])
+    job['notice_ids'].extend(notice_data['id'] for notice_data in created)
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -121,8 +1211,7 @@ def logout():
 @app.route('/dashboard')
 def dashboard():
     if 'username' in session:
-        departments = ['extc', 'it', 'mech', 'cs']
-        return render_template('dashboard.html', departments=departments)
+        return render_template('dashboard.html', departments=DEPARTMENTS)
     else:
         flash('Please login first.')
         return redirect(url_for('login'))
@@ -139,6 +1228,64 @@ def department(dept):
             return redirect(url_for('department', dept=dept))
     return render_template('department.html', department=dept)
 
+ADMIN_PAGE_SIZE = int(os.getenv('ADMIN_PAGE_SIZE', 24))
+
+def admin_notice(row):
+    notice = notice_payload(row)
+    notice['thumb'] = media_url(notice['filename'], 'thumb') if notice['filetype'] in IMAGE_FILETYPES else None
+    return notice
+
+def admin_entries(dept, kind, before=None, limit=ADMIN_PAGE_SIZE):
+    """Return up to limit admin listing entries older than before, plus the next cursor.
+
+    Pages converted from one PDF fold into a single entry, even when other
+    uploads landed between them. Entries are keyed by their first row's id,
+    which stays put while a PDF is still converting, and only the rows of
+    the entries on this page are loaded.
+    """
+    if kind == 'prescheduled':
+        when = "scheduled_time > NOW()"
+    else:
+        when = "(scheduled_time IS NULL OR scheduled_time <= NOW())"
+    next_before = None
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT MIN(id), MIN(document_id)
+            FROM notices
+            WHERE department=%s AND {when} AND (%s::integer IS NULL OR id < %s)
+            GROUP BY COALESCE(document_id, id::text)
+            ORDER BY MIN(id) DESC
+            LIMIT %s
+        """, (dept, before, before, limit + 1))
+        heads = c.fetchall()
+        if len(heads) > limit:
+            heads = heads[:limit]
+            next_before = heads[-1][0]
+        c.execute(f"""
+            SELECT {NOTICE_COLUMNS}
+            FROM notices
+            WHERE department=%s AND {when} AND (id = ANY(%s) OR document_id = ANY(%s))
+            ORDER BY id
+        """, (dept, [head for head, document_id in heads if document_id is None],
+              [document_id for head, document_id in heads if document_id is not None]))
+        rows = c.fetchall()
+    finally:
+        conn.close()
+    # Rows come oldest first, so a document's entry is its cover (page 1) and pages are in order.
+    by_key = {}
+    for row in rows:
+        notice = admin_notice(row)
+        key = notice['document_id'] or notice['id']
+        if key in by_key:
+            by_key[key]['pages'].append(notice)
+        else:
+            notice['pages'] = [dict(notice)] if notice['document_id'] else []
+            by_key[key] = notice
+    entries = [by_key[document_id or head] for head, document_id in heads if (document_id or head) in by_key]
+    return entries, next_before
+
 @app.route('/admin/<dept>', methods=['GET', 'POST'])
 def admin(dept):
     if 'dept' in session and session['dept'] == dept:
@@ -150,98 +1297,30 @@ def admin(dept):
                     return redirect(request.url)
                 if file and allowed_file(file.filename):
                     filename = secure_filename(file.filename)
-                    file_extension = filename.rsplit('.', 1)[1].lower()
-                    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(file_path)
-
-                    expire_date_str = request.form.get('expire_date')
-                    ist = timezone(timedelta(hours=5, minutes=30))
-                    if expire_date_str and expire_date_str.strip() != "":
-                        try:
-                            expire_dt = datetime.strptime(expire_date_str, "%Y-%m-%d")
-                            expire_dt = expire_dt.replace(hour=23, minute=59, second=59, tzinfo=ist)
-                            expire_time = expire_dt.astimezone(timezone.utc)
-                        except Exception:
-                            flash("Invalid expiration date format.")
-                            return redirect(request.url)
-                    else:
-                        expire_time = datetime.utcnow().replace(tzinfo=timezone.utc) + timedelta(days=30)
-
-                    conn = get_db_connection()
-                    c = conn.cursor()
-
-                    if file_extension == 'pdf':
-                        try:
-                            pages = convert_from_path(file_path, dpi=200)
-                            base_filename = filename.rsplit('.', 1)[0]
-                            for i, page in enumerate(pages, start=1):
-                                image_filename = f"{base_filename}_page_{i}.jpg"
-                                image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_filename)
-                                page.save(image_path, 'JPEG')
-                                c.execute("""
-                                    INSERT INTO notices (department, filename, filetype, scheduled_time, expire_time)
-                                    VALUES (%s, %s, %s, %s, %s)
-                                    RETURNING id
-                                """, (dept, image_filename, 'pdf_image', None, expire_time))
-                                new_id = c.fetchone()[0]
-                                notice_data = {
-                                    'id': new_id,
-                                    'department': dept,
-                                    'filename': image_filename,
-                                    'filetype': 'pdf_image',
-                                    'scheduled_time': None
-                                }
-                                socketio.emit('new_notice', notice_data, room=dept)
-                            conn.commit()
-                            flash('PDF converted and images uploaded successfully.')
-                        except Exception as e:
-                            conn.rollback()
-                            flash('Error converting PDF: ' + str(e))
-                        finally:
-                            conn.close()
-                        os.remove(file_path)
-                        return redirect(url_for('admin', dept=dept))
-                    
-                    c.execute("""
-                        INSERT INTO notices (department, filename, filetype, scheduled_time, expire_time)
-                        VALUES (%s, %s, %s, %s, %s)
-                        RETURNING id
-                    """, (dept, filename, file_extension, None, expire_time))
-                    new_id = c.fetchone()[0]
-                    conn.commit()
-                    conn.close()
-                    flash('File uploaded successfully.')
-                    notice_data = {
-                        'id': new_id,
-                        'department': dept,
-                        'filename': filename,
-                        'filetype': file_extension,
-                        'scheduled_time': None
-                    }
-                    socketio.emit('new_notice', notice_data, room=dept)
+                    staged = stage_upload(file.stream)
+                    UPLOAD_BYTES.labels('form').inc(staged['size'])
+
+                    default_expire = datetime.utcnow().replace(tzinfo=timezone.utc) + timedelta(days=30)
+                    try:
+                        expire_time = parse_expire_date(request.form.get('expire_date'), default_expire)
+                    except ValueError:
+                        offload(os.remove, staged['path'])
+                        flash("Invalid expiration date format.")
+                        return redirect(request.url)
+
+                    depts = target_departments(dept, request.form.getlist('departments'))
+                    flash(publish_upload(dept, staged, filename, None, expire_time, depts))
                     return redirect(url_for('admin', dept=dept))
             
-            conn = get_db_connection()
-            c = conn.cursor()
-            c.execute("""
-                SELECT * FROM notices
-                WHERE department=%s
-                AND (scheduled_time IS NULL OR scheduled_time <= NOW())
-                ORDER BY id DESC
-            """, (dept,))
-            immediate_notices = c.fetchall()
-            c.execute("""
-                SELECT * FROM notices
-                WHERE department=%s
-                AND scheduled_time > NOW()
-                ORDER BY id DESC
-            """, (dept,))
-            prescheduled_notices = c.fetchall()
-            conn.close()
+            immediate_entries, immediate_next = admin_entries(dept, 'immediate')
+            prescheduled_entries, prescheduled_next = admin_entries(dept, 'prescheduled')
             return render_template('admin.html',
                                    department=dept,
-                                   immediate_notices=immediate_notices,
-                                   prescheduled_notices=prescheduled_notices)
+                                   departments=DEPARTMENTS,
+                                   immediate_entries=immediate_entries,
+                                   immediate_next=immediate_next,
+                                   prescheduled_entries=prescheduled_entries,
+                                   prescheduled_next=prescheduled_next)
         except Exception as e:
             flash("An unexpected error occurred: " + str(e))
             return redirect(url_for('dashboard'))
@@ -254,23 +1333,63 @@ def delete_all_notices(dept):
     if 'dept' in session and session['dept'] == dept:
         conn = get_db_connection()
         c = conn.cursor()
-        c.execute("SELECT id, filename FROM notices WHERE department=%s", (dept,))
+        c.execute("DELETE FROM notices WHERE department=%s RETURNING id, filename", (dept,))
         notices = c.fetchall()
-        for (n_id, filename) in notices:
-            try:
-                os.remove(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-            except Exception as e:
-                print(e)
-            c.execute("DELETE FROM notices WHERE id=%s", (n_id,))
-            socketio.emit('delete_notice', {'id': n_id}, room=dept)
+        ids = [n_id for (n_id, filename) in notices]
+        if ids:
+            revision = record_notice_changes(c, dept, 'remove', ids)
+            release_blobs(c, [filename for (n_id, filename) in notices])
         conn.commit()
         conn.close()
+        if ids:
+            socketio.emit('delete_notices', {'ids': ids, 'revision': revision}, room=dept)
+        notice_cache.invalidate(dept)
+        notice_scheduler.wake()
         flash("All notices deleted successfully.")
         return redirect(url_for('admin', dept=dept))
     else:
         flash("Unauthorized access.")
         return redirect(url_for('login'))
 
+@app.route('/admin/<dept>/notices')
+def admin_notices(dept):
+    if 'dept' in session and session['dept'] == dept:
+        kind = request.args.get('kind', 'immediate')
+        if kind not in ('immediate', 'prescheduled'):
+            return jsonify({'error': 'Unknown listing.'}), 400
+        entries, next_before = admin_entries(dept, kind, request.args.get('before', type=int),
+                                             max(1, min(request.args.get('limit', ADMIN_PAGE_SIZE, type=int), 100)))
+        return jsonify({'entries': entries, 'next_before': next_before})
+    return jsonify({'error': 'Unauthorized access.'}), 403
+
+@app.route('/delete_document/<dept>/<document_id>')
+def delete_document(dept, document_id):
+    if 'dept' in session and session['dept'] == dept:
+        conn = get_db_connection()
+        try:
+            c = conn.cursor()
+            c.execute("DELETE FROM notices WHERE department=%s AND document_id=%s RETURNING id, filename",
+                      (dept, document_id))
+            notices = c.fetchall()
+            ids = [n_id for (n_id, filename) in notices]
+            if ids:
+                revision = record_notice_changes(c, dept, 'remove', ids)
+                release_blobs(c, [filename for (n_id, filename) in notices])
+            conn.commit()
+        finally:
+            conn.close()
+        if ids:
+            socketio.emit('delete_notices', {'ids': ids, 'revision': revision}, room=dept)
+            notice_cache.invalidate(dept)
+            notice_scheduler.wake()
+            flash('Document deleted successfully.')
+        else:
+            flash('Notice not found.')
+        return redirect(url_for('admin', dept=dept))
+    else:
+        flash('Unauthorized access.')
+        return redirect(url_for('login'))
+
 @app.route('/schedule_notice/<dept>', methods=['GET', 'POST'])
 def schedule_notice(dept):
     if 'dept' in session and session['dept'] == dept:
@@ -287,138 +1406,398 @@ def schedule_notice(dept):
                 return redirect(request.url)
             if file and allowed_file(file.filename):
                 try:
-                    scheduled_time_str = f"{date_str} {time_str} {ampm}"
-                    ist = timezone(timedelta(hours=5, minutes=30))
-                    naive_dt = datetime.strptime(scheduled_time_str, "%Y-%m-%d %I:%M %p")
-                    ist_dt = naive_dt.replace(tzinfo=ist)
-                    utc_dt = ist_dt.astimezone(timezone.utc)
+                    utc_dt = parse_scheduled_time(date_str, time_str, ampm)
                 except ValueError:
                     flash('Invalid date/time format. Please use the correct format (e.g., 02:30 PM).')
                     return redirect(request.url)
-                
-                expire_date_str = request.form.get('expire_date')
-                ist = timezone(timedelta(hours=5, minutes=30))
-                if expire_date_str and expire_date_str.strip() != "":
-                    try:
-                        expire_dt = datetime.strptime(expire_date_str, "%Y-%m-%d")
-                        expire_dt = expire_dt.replace(hour=23, minute=59, second=59, tzinfo=ist)
-                        expire_time = expire_dt.astimezone(timezone.utc)
-                    except Exception:
-                        flash("Invalid expiration date format.")
-                        return redirect(request.url)
-                else:
-                    expire_time = utc_dt + timedelta(days=30)
-                
+
+                try:
+                    expire_time = parse_expire_date(request.form.get('expire_date'), utc_dt + timedelta(days=30))
+                except ValueError:
+                    flash("Invalid expiration date format.")
+                    return redirect(request.url)
+
                 filename = secure_filename(file.filename)
-                file_extension = filename.rsplit('.', 1)[1].lower()
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                
-                conn = get_db_connection()
-                c = conn.cursor()
-                if file_extension == 'pdf':
-                    try:
-                        pages = convert_from_path(file_path, dpi=200)
-                        base_filename = filename.rsplit('.', 1)[0]
-                        for i, page in enumerate(pages, start=1):
-                            image_filename = f"{base_filename}_page_{i}.jpg"
-                            image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_filename)
-                            page.save(image_path, 'JPEG')
-                            c.execute("""
-                                INSERT INTO notices (department, filename, filetype, scheduled_time, expire_time)
-                                VALUES (%s, %s, %s, %s, %s)
-                                RETURNING id
-                            """, (dept, image_filename, 'pdf_image', utc_dt, expire_time))
-                            new_id = c.fetchone()[0]
-                            notice_data = {
-                                'id': new_id,
-                                'department': dept,
-                                'filename': image_filename,
-                                'filetype': 'pdf_image',
-                                'scheduled_time': utc_dt.strftime("%Y-%m-%d %H:%M:%S")
-                            }
-                            socketio.emit('new_prescheduled_notice', notice_data, room=dept)
-                        conn.commit()
-                        flash('PDF converted and images scheduled successfully.')
-                    except Exception as e:
-                        conn.rollback()
-                        flash('Error converting PDF: ' + str(e))
-                    finally:
-                        conn.close()
-                    os.remove(file_path)
-                    return redirect(url_for('admin', dept=dept))
-                else:
-                    c.execute("""
-                        INSERT INTO notices (department, filename, filetype, scheduled_time, expire_time)
-                        VALUES (%s, %s, %s, %s, %s)
-                        RETURNING id
-                    """, (dept, filename, file_extension, utc_dt, expire_time))
-                    new_id = c.fetchone()[0]
-                    conn.commit()
-                    conn.close()
-                    flash('Notice scheduled successfully.')
-                    notice_data = {
-                        'id': new_id,
-                        'department': dept,
-                        'filename': filename,
-                        'filetype': file_extension,
-                        'scheduled_time': utc_dt.strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    socketio.emit('new_prescheduled_notice', notice_data, room=dept)
-                    return redirect(url_for('admin', dept=dept))
-        return render_template('schedule_notice.html', department=dept)
+                staged = stage_upload(file.stream)
+                UPLOAD_BYTES.labels('form').inc(staged['size'])
+
+                depts = target_departments(dept, request.form.getlist('departments'))
+                flash(publish_upload(dept, staged, filename, utc_dt, expire_time, depts))
+                return redirect(url_for('admin', dept=dept))
+        return render_template('schedule_notice.html', department=dept, departments=DEPARTMENTS)
     else:
         flash('Unauthorized access.')
         return redirect(url_for('department', dept=dept))
 
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+STREAM_BUFFER_SIZE = 1024 * 1024
+UPLOAD_SESSION_TTL_HOURS = 24
+# upload_id -> (offset, sha256) for bytes this process has already hashed.
+upload_hashers = {}
+upload_locks = collections.defaultdict(eventlet.semaphore.Semaphore)
+
+def upload_part_path(upload_id):
+    return os.path.join(app.config['UPLOAD_FOLDER'], upload_id + '.part')
+
+def get_upload_session(upload_id, dept):
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute("""
+            SELECT filename, total_size, received, scheduled_time, expire_time, departments
+            FROM upload_sessions WHERE id=%s AND department=%s
+        """, (upload_id, dept))
+        row = c.fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    filename, total_size, received, scheduled_time, expire_time, depts = row
+    return {
+        'filename': filename,
+        'total_size': total_size,
+        'received': received,
+        'scheduled_time': scheduled_time,
+        'expire_time': expire_time,
+        'departments': depts or [dept]
+    }
+
+def hash_part(path, length):
+    sha256 = hashlib.sha256()
+    remaining = length
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            block = f.read(min(STREAM_BUFFER_SIZE, remaining))
+            if not block:
+                break
+            sha256.update(block)
+            remaining -= len(block)
+    return sha256
+
+def upload_hasher(upload_id, received):
+    # Chunks normally arrive at the process that hashed the previous one; after
+    # a restart or on another worker, rebuild the hash from the bytes on disk.
+    # Callers update the hasher in place and store it back only once the chunk
+    # is committed, so a failed chunk must not touch the cached one.
+    cached = upload_hashers.get(upload_id)
+    if cached and cached[0] == received:
+        return cached[1].copy()
+    # Up to the whole .part file; read and hash it off the hub.
+    return offload(hash_part, upload_part_path(upload_id), received)
+
+def upload_session_response(upload_id, upload):
+    return {
+        'upload_id': upload_id,
+        'filename': upload['filename'],
+        'size': upload['total_size'],
+        'offset': upload['received'],
+        'chunk_size': UPLOAD_CHUNK_SIZE
+    }
+
+@app.route('/upload_sessions/<dept>', methods=['POST'])
+def create_upload_session(dept):
+    if not ('dept' in session and session['dept'] == dept):
+        return jsonify({'error': 'Unauthorized access.'}), 403
+    data = request.get_json(silent=True) or request.form
+    filename = secure_filename(data.get('filename', ''))
+    if not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed.'}), 400
+    try:
+        total_size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Missing file size.'}), 400
+    if total_size < 0 or total_size > app.config['MAX_CONTENT_LENGTH']:
+        return jsonify({'error': 'File too large.'}), 413
+
+    scheduled_time = None
+    if data.get('date') or data.get('time'):
+        try:
+            scheduled_time = parse_scheduled_time(data.get('date'), data.get('time'), data.get('ampm'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid date/time format. Please use the correct format (e.g., 02:30 PM).'}), 400
+    default_expire = (scheduled_time or datetime.utcnow().replace(tzinfo=timezone.utc)) + timedelta(days=30)
+    try:
+        expire_time = parse_expire_date(data.get('expire_date'), default_expire)
+    except ValueError:
+        return jsonify({'error': 'Invalid expiration date format.'}), 400
+
+    requested = data.getlist('departments') if hasattr(data, 'getlist') else data.get('departments') or []
+    depts = target_departments(dept, requested)
+
+    upload_id = uuid.uuid4().hex
+    open(upload_part_path(upload_id), 'wb').close()
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO upload_sessions (id, department, filename, total_size, scheduled_time, expire_time, departments)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (upload_id, dept, filename, total_size, scheduled_time, expire_time, depts))
+        conn.commit()
+    finally:
+        conn.close()
+    upload_hashers[upload_id] = (0, hashlib.sha256())
+    upload = {'filename': filename, 'total_size': total_size, 'received': 0}
+    return jsonify(upload_session_response(upload_id, upload)), 201
+
+@app.route('/upload_sessions/<dept>/<upload_id>', methods=['GET', 'PUT'])
+def upload_chunk(dept, upload_id):
+    if not ('dept' in session and session['dept'] == dept):
+        return jsonify({'error': 'Unauthorized access.'}), 403
+    with upload_locks[upload_id]:
+        upload = get_upload_session(upload_id, dept)
+        if upload is None:
+            return jsonify({'error': 'Upload not found.'}), 404
+        if request.method == 'GET':
+            return jsonify(upload_session_response(upload_id, upload))
+
+        offset = request.args.get('offset', type=int)
+        if offset != upload['received']:
+            # Client and server disagree after a dropped connection; tell it where to resume.
+            return jsonify(upload_session_response(upload_id, upload)), 409
+        sha256 = upload_hasher(upload_id, offset)
+        remaining = upload['total_size'] - offset
+        written = 0
+        too_large = False
+        with open(upload_part_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            try:
+                while True:
+                    block = request.stream.read(STREAM_BUFFER_SIZE)
+                    if not block:
+                        break
+                    if written + len(block) > remaining:
+                        block = block[:remaining - written]
+                        too_large = True
+                    offload(f.write, block)
+                    sha256.update(block)
+                    written += len(block)
+                    if too_large:
+                        break
+            except ClientDisconnected:
+                # Keep whatever arrived so the client can resume from there.
+                pass
+        upload['received'] = offset + written
+        UPLOAD_BYTES.labels('chunked').inc(written)
+        conn = get_db_connection()
+        try:
+            c = conn.cursor()
+            c.execute("UPDATE upload_sessions SET received=%s, updated_at=NOW() WHERE id=%s",
+                      (upload['received'], upload_id))
+            conn.commit()
+        finally:
+            conn.close()
+        upload_hashers[upload_id] = (upload['received'], sha256)
+        if too_large:
+            return jsonify({'error': 'Chunk extends past the declared file size.'}), 413
+        return jsonify(upload_session_response(upload_id, upload))
+
+@app.route('/upload_sessions/<dept>/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(dept, upload_id):
+    if not ('dept' in session and session['dept'] == dept):
+        return jsonify({'error': 'Unauthorized access.'}), 403
+    with upload_locks[upload_id]:
+        upload = get_upload_session(upload_id, dept)
+        if upload is None:
+            return jsonify({'error': 'Upload not found.'}), 404
+        if upload['received'] != upload['total_size']:
+            return jsonify(upload_session_response(upload_id, upload)), 409
+        digest = upload_hasher(upload_id, upload['received']).hexdigest()
+        expected = (request.get_json(silent=True) or {}).get('sha256')
+        if expected and expected.lower() != digest:
+            return jsonify({'error': 'Checksum mismatch.', 'sha256': digest}), 422
+
+        part_path = upload_part_path(upload_id)
+        with open(part_path, 'r+b') as f:
+            f.truncate(upload['total_size'])
+        staged = {'path': part_path, 'sha256': digest, 'size': upload['total_size']}
+        conn = get_db_connection()
+        try:
+            c = conn.cursor()
+            c.execute("DELETE FROM upload_sessions WHERE id=%s", (upload_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        upload_hashers.pop(upload_id, None)
+    upload_locks.pop(upload_id, None)
+    message = publish_upload(dept, staged, upload['filename'], upload['scheduled_time'], upload['expire_time'],
+                             upload['departments'])
+    flash(message)
+    return jsonify({'message': message, 'sha256': digest})
+
+def purge_stale_upload_sessions():
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute("""
+            DELETE FROM upload_sessions
+            WHERE updated_at < NOW() - %s * INTERVAL '1 hour'
+            RETURNING id
+        """, (UPLOAD_SESSION_TTL_HOURS,))
+        stale = [row[0] for row in c.fetchall()]
+        conn.commit()
+    finally:
+        conn.close()
+    for upload_id in stale:
+        upload_hashers.pop(upload_id, None)
+        try:
+            offload(os.remove, upload_part_path(upload_id))
+        except Exception as e:
+            print(e)
+
+# Staged uploads (<id>.part) and rendered PDF pages (<job id>.page<n>-<page>.jpg).
+STAGING_FILE = re.compile(r'^([0-9a-f]{32})\.(?:part|page\d+-\d+\.jpg)$')
+ORPHAN_MIN_AGE_HOURS = 1
+
+def remove_orphaned_files(keep, min_age):
+    cutoff = time.time() - min_age
+    for entry in os.scandir(app.config['UPLOAD_FOLDER']):
+        match = STAGING_FILE.match(entry.name)
+        if match is None or match.group(1) in keep:
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+def sweep_orphaned_files():
+    """Remove staging files no upload session or unfinished job refers to, left by a process that died."""
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute("SELECT id FROM upload_sessions")
+        keep = {row[0] for row in c.fetchall()}
+        c.execute("SELECT id, staged_path FROM jobs WHERE status IN ('queued', 'running')")
+        for job_id, staged_path in c.fetchall():
+            keep.add(job_id)
+            keep.add(os.path.basename(staged_path).split('.', 1)[0])
+    finally:
+        conn.close()
+    # The age check spares form uploads still being staged, which have no row yet.
+    offload(remove_orphaned_files, keep, ORPHAN_MIN_AGE_HOURS * 3600)
+
+def prune_socketio_messages():
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute("DELETE FROM socketio_messages WHERE created_at < NOW() - INTERVAL '1 hour'")
+        conn.commit()
+    finally:
+        conn.close()
+
+def housekeeping_loop():
+    while True:
+        try:
+            purge_stale_upload_sessions()
+            prune_jobs()
+            sweep_orphaned_files()
+            prune_notice_changes()
+            prune_socketio_messages()
+        except Exception as e:
+            print("Error in housekeeping:", e)
+        eventlet.sleep(3600)
+
 @app.route('/delete_notice/<int:notice_id>')
 def delete_notice(notice_id):
     if 'dept' in session:
+        # Return the connection before invalidating and emitting: both check out
+        # their own for cross-process delivery.
+        revision = None
         conn = get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT filename, department FROM notices WHERE id=%s", (notice_id,))
-        notice = c.fetchone()
-        if notice:
-            filename, department = notice
-            if session['dept'] == department:
-                try:
-                    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                except Exception as e:
-                    print(e)
+        try:
+            c = conn.cursor()
+            c.execute("SELECT filename, department FROM notices WHERE id=%s", (notice_id,))
+            notice = c.fetchone()
+            if notice and session['dept'] == notice[1]:
+                filename, department = notice
                 c.execute("DELETE FROM notices WHERE id=%s", (notice_id,))
+                revision = record_notice_changes(c, department, 'remove', [notice_id])
+                release_blobs(c, [filename])
                 conn.commit()
-                flash('Notice deleted successfully.')
-                socketio.emit('delete_notice', {'id': notice_id}, room=department)
-            else:
-                flash('Unauthorized action.')
+        finally:
+            conn.close()
+        if revision is not None:
+            notice_cache.invalidate(department)
+            notice_scheduler.wake()
+            flash('Notice deleted successfully.')
+            socketio.emit('delete_notice', {'id': notice_id, 'revision': revision}, room=department)
+        elif notice:
+            flash('Unauthorized action.')
         else:
             flash('Notice not found.')
-        conn.close()
         return redirect(url_for('admin', dept=session.get('dept')))
     else:
         flash('Unauthorized access.')
         return redirect(url_for('login'))
 
+def pick_rendition(filename, size):
+    # Only trust explicit mentions; */* does not mean the client can decode AVIF.
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    for fmt in RENDITION_FORMATS:
+        if fmt != 'jpg' and RENDITION_MIMETYPES[fmt] not in accepted:
+            continue
+        candidate = rendition_filename(filename, size, fmt)
+        if os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], candidate)):
+            return candidate
+    return None
+
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    size = request.args.get('size')
+    served = filename
+    if size in RENDITION_SIZES:
+        served = pick_rendition(filename, size) or filename
+    digest = media_digest(served)
+    if digest is None:
+        return send_from_directory(app.config['UPLOAD_FOLDER'], served)
+    # Renditions share their blob's hash; each format/size still needs its own entity tag.
+    etag = digest if served == filename else f"{digest}.{served[len(filename) + 1:]}"
+    if MEDIA_OFFLOAD == 'x-accel':
+        response = make_response('')
+        response.headers['X-Accel-Redirect'] = MEDIA_ACCEL_PREFIX + quote(served)
+        response.headers['Content-Type'] = mimetypes.guess_type(served)[0] or 'application/octet-stream'
+        response.set_etag(etag)
+    else:
+        # conditional send_file answers If-None-Match with 304 and Range with 206.
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], served, etag=etag)
+    if size in RENDITION_SIZES:
+        response.vary.add('Accept')
+    name = secure_filename(request.args.get('name', ''))
+    if name and served.rsplit('.', 1)[-1] in DOWNLOAD_FILETYPES:
+        response.headers.set('Content-Disposition', 'attachment', filename=name)
+    # ?v= is the original's hash. A size request answered with the original
+    # (rendition not built yet) must not be pinned, or it would stick forever.
+    pinned = served != filename or size not in RENDITION_SIZES
+    # The original can be gone while a rendition lingers; without its hash the URL can't be pinned.
+    original_digest = digest if served == filename else media_digest(filename)
+    if pinned and original_digest and request.args.get('v') == original_digest[:16]:
+        response.headers['Cache-Control'] = f'public, max-age={MEDIA_IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/sw.js')
+def service_worker():
+    # Served from the root rather than /static so its scope covers the slideshow pages and /uploads.
+    response = send_from_directory(app.static_folder, 'sw.js')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# How many upcoming slides the slideshow preloads from the manifest.
+SLIDESHOW_PRELOAD = int(os.getenv('SLIDESHOW_PRELOAD', 3))
 
 @app.route('/<dept>')
 def public_dept(dept):
     dept = dept.lower()
-    if dept in ['extc', 'it', 'mech', 'cs']:
-        conn = get_db_connection()
-        c = conn.cursor()
-        c.execute("""
-            SELECT * FROM notices
-            WHERE department=%s
-            AND (scheduled_time IS NULL OR scheduled_time <= NOW())
-            AND expire_time > NOW()
-            ORDER BY id DESC
-        """, (dept,))
-        notices = c.fetchall()
-        conn.close()
-        return render_template('slideshow.html', department=dept, notices=notices, hide_nav=True)
+    if dept in DEPARTMENTS:
+        entry = notice_cache.get(dept)
+        if '_flashes' in session:
+            # Pending flash messages are user specific; don't bake them into the shared page.
+            return render_template('slideshow.html', department=dept, notices=entry['payloads'], revision=entry['revision'], preload=SLIDESHOW_PRELOAD, hide_nav=True)
+        if entry['html'] is None:
+            entry['html'] = render_template('slideshow.html', department=dept, notices=entry['payloads'], revision=entry['revision'], preload=SLIDESHOW_PRELOAD, hide_nav=True)
+        return cached_notice_response(entry, 'html', 'text/html')
     else:
         flash('Department not found.')
         return redirect(url_for('index'))
@@ -426,83 +1805,330 @@ def public_dept(dept):
 @app.route('/get_latest_notices/<dept>')
 def get_latest_notices(dept):
     dept = dept.lower()
-    if dept in ['extc', 'it', 'mech', 'cs']:
-        conn = get_db_connection()
+    if dept in DEPARTMENTS:
+        return cached_notice_response(notice_cache.get(dept), 'json', 'application/json')
+    else:
+        return jsonify([])
+
+@app.route('/manifest/<dept>')
+def slideshow_manifest(dept):
+    dept = dept.lower()
+    if dept not in DEPARTMENTS:
+        return jsonify({'error': 'Department not found.'}), 404
+    return cached_notice_response(notice_cache.get(dept), 'manifest', 'application/json')
+
+@app.route('/notice_changes/<dept>')
+def notice_changes(dept):
+    dept = dept.lower()
+    if dept not in DEPARTMENTS:
+        return jsonify({'error': 'Department not found.'}), 404
+    since = request.args.get('since', type=int)
+    entry = notice_cache.get(dept)
+    if since == entry['revision']:
+        return jsonify({'revision': since, 'added': [], 'removed': []})
+
+    conn = get_db_connection()
+    try:
         c = conn.cursor()
+        c.execute("SELECT revision, pruned_through FROM department_revisions WHERE department=%s", (dept,))
+        revision, pruned_through = c.fetchone() or (0, 0)
+        if since is None or since < pruned_through or since > revision:
+            # Too old (changes pruned) or from before a database reset: send everything.
+            return jsonify({'revision': entry['revision'], 'reset': True, 'notices': json.loads(entry['json'])})
         c.execute("""
-            SELECT id, department, filename, filetype, scheduled_time, expire_time
+            SELECT notice_id, change FROM notice_changes
+            WHERE department=%s AND revision > %s AND revision <= %s
+            ORDER BY revision
+        """, (dept, since, revision))
+        latest_change = {}
+        for notice_id, change in c.fetchall():
+            latest_change[notice_id] = change
+        added_ids = [n_id for n_id, change in latest_change.items() if change == 'add']
+        c.execute(f"""
+            SELECT {NOTICE_COLUMNS}
             FROM notices
-            WHERE department=%s
+            WHERE id = ANY(%s)
             AND (scheduled_time IS NULL OR scheduled_time <= NOW())
             AND expire_time > NOW()
             ORDER BY id DESC
-        """, (dept,))
-        notices = c.fetchall()
+        """, (added_ids,))
+        added = [notice_payload(row) for row in c.fetchall()]
+    finally:
         conn.close()
-        results = []
-        for n in notices:
-            results.append({
-                'id': n[0],
-                'department': n[1],
-                'filename': n[2],
-                'filetype': n[3],
-                'scheduled_time': n[4].strftime("%Y-%m-%d %H:%M:%S") if n[4] else None,
-                'expire_time': n[5].strftime("%Y-%m-%d %H:%M:%S") if n[5] else None
-            })
-        return jsonify(results)
-    else:
-        return jsonify([])
+    still_active = {n['id'] for n in added}
+    removed = [n_id for n_id in latest_change if n_id not in still_active]
+    return jsonify({'revision': revision, 'added': added, 'removed': removed})
+
+@app.route('/pdf_jobs/<dept>')
+def list_pdf_jobs(dept):
+    if 'dept' in session and session['dept'] == dept:
+        return jsonify(list_jobs('pdf', dept))
+    return jsonify({'error': 'Unauthorized access.'}), 403
+
+@app.route('/video_jobs/<dept>')
+def list_video_jobs(dept):
+    if 'dept' in session and session['dept'] == dept:
+        return jsonify(list_jobs('video', dept))
+    return jsonify({'error': 'Unauthorized access.'}), 403
+
+@app.route('/pdf_jobs/<dept>/<job_id>')
+def pdf_job_status(dept, job_id):
+    if 'dept' in session and session['dept'] == dept:
+        conn = get_db_connection()
+        try:
+            c = conn.cursor()
+            c.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id=%s AND kind='pdf' AND department=%s", (job_id, dept))
+            row = c.fetchone()
+        finally:
+            conn.close()
+        if row:
+            return jsonify(job_payload(row))
+        return jsonify({'error': 'Job not found.'}), 404
+    return jsonify({'error': 'Unauthorized access.'}), 403
+
+@app.route('/metrics')
+def metrics():
+    for room in DEPARTMENTS:
+        SOCKET_CLIENTS.labels(room).set(sum(1 for _ in socketio.server.manager.get_participants('/', room)))
+    return app.response_class(generate_latest(), content_type=CONTENT_TYPE_LATEST)
+
+@app.route('/db_pool_stats')
+def db_pool_stats():
+    return jsonify(get_db_pool().stats())
 
 @socketio.on('join')
 def on_join(dept):
     join_room(dept)
     print(f"A client joined room: {dept}")
 
-def background_notice_check():
-    while True:
+def process_due_notices():
+    conn = get_db_connection()
+    try:
+        c = conn.cursor()
+        c.execute(f"""
+            UPDATE notices SET broadcasted = true
+            WHERE scheduled_time IS NOT NULL AND scheduled_time <= NOW() AND broadcasted = false
+            RETURNING {NOTICE_COLUMNS}, EXTRACT(EPOCH FROM (NOW() - scheduled_time))
+        """)
+        broadcast_notices = c.fetchall()
+        c.execute("""
+            DELETE FROM notices
+            WHERE expire_time <= NOW()
+            RETURNING id, department, filename
+        """)
+        expired_notices = c.fetchall()
+
+        new_by_dept = collections.defaultdict(list)
+        for row in sorted(broadcast_notices, key=lambda n: n[0]):
+            SCHEDULER_LAG_SECONDS.observe(float(row[-1]))
+            notice_data = notice_payload(row[:-1])
+            new_by_dept[notice_data['department']].append(notice_data)
+        expired_by_dept = collections.defaultdict(list)
+        for n_id, dept, filename in expired_notices:
+            expired_by_dept[dept].append(n_id)
+        new_revisions = {}
+        for dept, notices in new_by_dept.items():
+            new_revisions[dept] = record_notice_changes(c, dept, 'add', [n['id'] for n in notices])
+        expired_revisions = {}
+        for dept, ids in expired_by_dept.items():
+            expired_revisions[dept] = record_notice_changes(c, dept, 'remove', ids)
+        if expired_notices:
+            release_blobs(c, [filename for n_id, dept, filename in expired_notices])
+        conn.commit()
+    finally:
+        conn.close()
+
+    for dept in set(new_by_dept) | set(expired_by_dept):
+        notice_cache.invalidate(dept)
+    for dept, notices in new_by_dept.items():
+        socketio.emit('new_notices', {'notices': notices, 'revision': new_revisions[dept], 'emitted_at': time.time()},
+                      room=dept)
+    for dept, ids in expired_by_dept.items():
+        socketio.emit('delete_notices', {'ids': ids, 'revision': expired_revisions[dept]}, room=dept)
+
+SCHEDULER_RESYNC_INTERVAL = float(os.getenv('SCHEDULER_RESYNC_INTERVAL', 300))
+SCHEDULER_LOCK_ID = 7263002
+SCHEDULER_LEADER_RETRY = float(os.getenv('SCHEDULER_LEADER_RETRY', 15))
+
+class NoticeScheduler:
+    """Sleeps until the next scheduled_time/expire_time deadline instead of polling.
+
+    Deadlines within two resync intervals are kept in a min-heap, so every
+    deadline is loaded at least one interval before it falls due. wake()
+    forces an early resync after notices are added or removed.
+
+    When clustered, only the process holding a session-level advisory lock
+    runs the sweeps; the others retry the lock until the leader goes away.
+    """
+
+    def __init__(self, resync_interval=SCHEDULER_RESYNC_INTERVAL):
+        self.resync_interval = resync_interval
+        self._deadlines = []
+        self._wakeups = eventlet.queue.LightQueue()
+        self._leading = not CLUSTERED
+
+    def wake(self, broadcast=True):
+        # A follower never reads its queue, so only the leader queues wake-ups.
+        if self._leading:
+            self._wakeups.put(None)
+        if broadcast:
+            cluster_notify('notice_scheduler', '')
+
+    def resync(self):
+        horizon = 2 * self.resync_interval
+        conn = get_db_connection()
         try:
-            conn = get_db_connection()
             c = conn.cursor()
             c.execute("""
-                SELECT id, department, filename, filetype, scheduled_time 
-                FROM notices
-                WHERE scheduled_time IS NOT NULL AND scheduled_time <= NOW() AND broadcasted = false
-            """)
-            scheduled_notices = c.fetchall()
-            for notice in scheduled_notices:
-                n_id, dept, filename, filetype, scheduled_time = notice
-                notice_data = {
-                    'id': n_id,
-                    'department': dept,
-                    'filename': filename,
-                    'filetype': filetype,
-                    'scheduled_time': scheduled_time.strftime("%Y-%m-%d %H:%M:%S") if scheduled_time else None
-                }
-                socketio.emit('remove_prescheduled_notice', {'id': n_id}, room=dept)
-                socketio.emit('new_notice', notice_data, room=dept)
-                c.execute("UPDATE notices SET broadcasted = true WHERE id = %s", (n_id,))
-            conn.commit()
-
-            c.execute("""
-                SELECT id, department, filename FROM notices
-                WHERE expire_time <= NOW()
-            """)
-            expired_notices = c.fetchall()
-            for notice in expired_notices:
-                n_id, dept, filename = notice
-                try:
-                    os.remove(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                except Exception as e:
-                    print(e)
-                c.execute("DELETE FROM notices WHERE id = %s", (n_id,))
-                socketio.emit('delete_notice', {'id': n_id}, room=dept)
-            conn.commit()
+                SELECT EXTRACT(EPOCH FROM (scheduled_time - NOW())), id FROM notices
+                WHERE scheduled_time IS NOT NULL AND broadcasted = false
+                AND scheduled_time <= NOW() + %s * INTERVAL '1 second'
+                UNION ALL
+                SELECT EXTRACT(EPOCH FROM (expire_time - NOW())), id FROM notices
+                WHERE expire_time <= NOW() + %s * INTERVAL '1 second'
+            """, (horizon, horizon))
+            rows = c.fetchall()
+        finally:
             conn.close()
+        now = time.monotonic()
+        self._deadlines = [(now + float(seconds), n_id) for seconds, n_id in rows]
+        heapq.heapify(self._deadlines)
+
+    def _wait(self, timeout):
+        try:
+            self._wakeups.get(timeout=max(timeout, 0))
+        except eventlet.queue.Empty:
+            return False
+        while not self._wakeups.empty():
+            self._wakeups.get_nowait()
+        return True
+
+    def _become_leader(self):
+        # The lock lives as long as this connection, so a crashed or
+        # partitioned leader hands over to the next process automatically.
+        conn = psycopg2.connect(get_db_pool().dsn)
+        conn.autocommit = True
+        c = conn.cursor()
+        while True:
+            c.execute("SELECT pg_try_advisory_lock(%s)", (SCHEDULER_LOCK_ID,))
+            if c.fetchone()[0]:
+                print("This process is now the notice scheduler leader.")
+                return conn
+            eventlet.sleep(SCHEDULER_LEADER_RETRY)
+
+    def _run_once(self):
+        self.resync()
+        resync_at = time.monotonic() + self.resync_interval
+        while True:
+            now = time.monotonic()
+            if self._deadlines and self._deadlines[0][0] <= now:
+                process_due_notices()
+                return
+            if now >= resync_at:
+                return
+            next_deadline = self._deadlines[0][0] if self._deadlines else resync_at
+            # Small slack so NOW() in Postgres is past the deadline when we query.
+            if self._wait(min(next_deadline, resync_at) - now + 0.01):
+                return
+
+    def run(self):
+        while True:
+            lock_conn = None
+            try:
+                if CLUSTERED:
+                    lock_conn = self._become_leader()
+                    self._leading = True
+                while True:
+                    if lock_conn is not None:
+                        # Raises if the session, and with it the lock, is gone.
+                        lock_conn.cursor().execute("SELECT 1")
+                    self._run_once()
+            except Exception as e:
+                print("Error in notice scheduler:", e)
+                eventlet.sleep(5)
+            finally:
+                if lock_conn is not None:
+                    self._leading = False
+                    lock_conn.close()
+
+notice_scheduler = NoticeScheduler()
+
+def cluster_listener():
+    """Apply cache invalidations and scheduler wake-ups sent by other processes."""
+    while True:
+        conn = None
+        try:
+            conn = listen_connection(get_db_pool().dsn, ['notice_cache', 'notice_scheduler'])
+            for notify in iter_notifies(conn):
+                sender, _, message = notify.payload.partition(' ')
+                if sender == PROCESS_ID:
+                    continue
+                if notify.channel == 'notice_cache':
+                    notice_cache.invalidate(message, broadcast=False)
+                else:
+                    notice_scheduler.wake(broadcast=False)
         except Exception as e:
-            print("Error in background_notice_check:", e)
-        eventlet.sleep(10)
+            print("Error in cluster listener:", e)
+            eventlet.sleep(5)
+        finally:
+            if conn is not None:
+                conn.close()
+
+HUB_BLOCK_THRESHOLD = float(os.getenv('HUB_BLOCK_THRESHOLD', 0.5))
+
+class HubBlockDetector:
+    """Logs the stack of any greenlet that keeps the hub busy past threshold seconds.
+
+    A greenlet bumps a heartbeat every interval; a native thread watches it
+    and, when it goes stale, prints what the hub thread is running right now.
+    """
+
+    def __init__(self, threshold, interval=0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self._heartbeat = time.monotonic()
+        self._hub_thread_id = eventlet.patcher.original('threading').get_ident()
+
+    def _beat(self):
+        while True:
+            self._heartbeat = time.monotonic()
+            eventlet.sleep(self.interval)
+
+    def _watch(self):
+        sleep = eventlet.patcher.original('time').sleep
+        reported = False
+        while True:
+            sleep(self.interval)
+            stalled = time.monotonic() - self._heartbeat
+            if stalled < self.threshold:
+                reported = False
+            elif not reported:
+                reported = True
+                HUB_BLOCKS.inc()
+                frame = sys._current_frames().get(self._hub_thread_id)
+                stack = ''.join(traceback.format_stack(frame)) if frame else ''
+                print("Eventlet hub blocked for %.2fs:\n%s" % (stalled, stack), flush=True)
+
+    def start(self):
+        eventlet.spawn(self._beat)
+        watcher = eventlet.patcher.original('threading').Thread(target=self._watch, daemon=True)
+        watcher.start()
+
+if HUB_BLOCK_THRESHOLD > 0:
+    HubBlockDetector(HUB_BLOCK_THRESHOLD).start()
 
-eventlet.spawn(background_notice_check)
+eventlet.spawn(notice_scheduler.run)
+if CLUSTERED:
+    eventlet.spawn(cluster_listener)
+eventlet.spawn(housekeeping_loop)
+for _ in range(RENDITION_WORKERS):
+    eventlet.spawn(rendition_worker)
+eventlet.spawn(job_heartbeat)
+for _ in range(PDF_WORKERS):
+    eventlet.spawn(job_worker, 'pdf', run_pdf_job)
+if FFMPEG:
+    for _ in range(VIDEO_WORKERS):
+        eventlet.spawn(job_worker, 'video', run_video_job)
 
 if __name__ == '__main__':
     port = int(os.environ.get("PORT") or 5000)
@@ -0,0 +1,350 @@
+# Load benchmark for the slideshow, upload and Socket.IO fan-out paths.
+#
+# Starts one or more app.py processes against a throwaway schema, then runs
+# simulated slideshow displays (join their department room, poll
+# get_latest_notices, fetch /uploads media) alongside admins uploading images
+# and multi-page PDFs:
+#
+#   pip install "python-socketio[client]"
+#   DATABASE_URL=postgres://... python benchmark_load.py --clients 200 --uploaders 4 --duration 60
+#
+# Reports p50/p99 latency and throughput per request type, how long new
+# notices take to reach the displays once the server emits them and the
+# resident memory of each worker.
+# With --workers N > 1 the workers share events through the Postgres message
+# queue and uploads all go to the first one, so the fan-out crosses processes.
+# --url benchmarks an already running server instead (no memory figures).
+# Its uploads would stay on that server, so --url runs no uploaders unless
+# --allow-uploads is given, and its lag figures assume both hosts' clocks agree.
+
+import os
+import io
+import sys
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import collections
+import glob
+import uuid
+import hashlib
+
+import psycopg2
+import psycopg2.extensions
+import requests
+import socketio
+from PIL import Image, ImageDraw
+
+LOAD_SCHEMA = 'notice_load'
+# app.py serves uploads relative to its own directory, so workers run there
+# and share its uploads/; the files a run leaves are found through its schema.
+RUN_PREFIX = 'load' + uuid.uuid4().hex[:8]
+DEPARTMENTS = ['extc', 'it', 'mech', 'cs']
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Recorder:
+    """Thread-safe latency samples per operation name."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = collections.defaultdict(list)
+        self.errors = collections.Counter()
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.samples[name].append(seconds * 1000)
+
+    def error(self, name):
+        with self.lock:
+            self.errors[name] += 1
+
+    def timed(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = func(*args, **kwargs)
+        except Exception:
+            self.error(name)
+            return None
+        self.add(name, time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.error(name)
+        return response
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def sample_image(seed):
+    # Uploads are stored by content hash, so every image must differ from the
+    # others in this run and from anything already in uploads/.
+    image = Image.new('RGB', (1920, 1080), ((seed * 37) % 256, (seed * 91) % 256, (seed * 53) % 256))
+    ImageDraw.Draw(image).text((40, 40), f'{RUN_PREFIX} {seed}', fill=(255, 255, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+def sample_pdf(pages, seed):
+    images = [Image.new('RGB', (1240, 1754), ((seed + i) * 29 % 256, 200, 200)) for i in range(pages)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, 'PDF', save_all=True, append_images=images[1:])
+    return buffer.getvalue()
+
+def reset_schema(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        c = conn.cursor()
+        c.execute(f"DROP SCHEMA IF EXISTS {LOAD_SCHEMA} CASCADE")
+        c.execute(f"CREATE SCHEMA {LOAD_SCHEMA}")
+        conn.commit()
+    finally:
+        conn.close()
+
+def drop_schema(dsn):
+    conn = psycopg2.connect(dsn)
+    try:
+        c = conn.cursor()
+        c.execute(f"DROP SCHEMA IF EXISTS {LOAD_SCHEMA} CASCADE")
+        conn.commit()
+    finally:
+        conn.close()
+
+def run_files(dsn):
+    """Every blob the benchmark schema stored, minus any the app's own schema also uses."""
+    conn = psycopg2.connect(dsn)
+    try:
+        c = conn.cursor()
+        c.execute(f"""
+            SELECT filename FROM {LOAD_SCHEMA}.blobs
+            UNION SELECT filename FROM {LOAD_SCHEMA}.notices
+        """)
+        filenames = {row[0] for row in c.fetchall()}
+        # Blobs are content-addressed in a shared uploads/, so an identical
+        # upload in the real schema points at the very same file.
+        c.execute("SELECT to_regclass('notices')")
+        if c.fetchone()[0] is not None:
+            c.execute("SELECT DISTINCT filename FROM notices WHERE filename = ANY(%s)", (list(filenames),))
+            filenames -= {row[0] for row in c.fetchall()}
+        return filenames
+    finally:
+        conn.close()
+
+def remove_run_files(filenames):
+    uploads = os.path.join(APP_DIR, 'uploads')
+    for filename in filenames:
+        # Renditions are named <filename>.<size>.<format>.
+        paths = [os.path.join(uploads, filename)] + glob.glob(os.path.join(glob.escape(uploads), glob.escape(filename) + '.*'))
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+def start_workers(dsn, count, port, workdir):
+    env = dict(os.environ)
+    env['DATABASE_URL'] = psycopg2.extensions.make_dsn(dsn, options=f'-c search_path={LOAD_SCHEMA}')
+    if count > 1:
+        env['SOCKETIO_MESSAGE_QUEUE'] = 'postgres'
+    workers = []
+    for i in range(count):
+        env['PORT'] = str(port + i)
+        log = open(os.path.join(workdir, f'worker-{i}.log'), 'w')
+        process = subprocess.Popen([sys.executable, os.path.join(APP_DIR, 'app.py')],
+                                   cwd=APP_DIR, env=dict(env), stdout=log, stderr=subprocess.STDOUT)
+        workers.append((process, f'http://127.0.0.1:{port + i}'))
+    for process, url in workers:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if requests.get(url + '/get_latest_notices/it', timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                with open(os.path.join(workdir, f'worker-{workers.index((process, url))}.log')) as log:
+                    print(log.read())
+                raise Exception(f"worker at {url} did not start")
+            time.sleep(0.2)
+    return workers
+
+def rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def memory_sampler(workers, peaks, stop):
+    while not stop.is_set():
+        for process, url in workers:
+            rss = rss_kb(process.pid)
+            if rss:
+                peaks[url] = max(peaks.get(url, 0), rss)
+        stop.wait(1)
+
+class Display:
+    """One slideshow screen: a room member that also polls and fetches media."""
+
+    def __init__(self, base_url, dept, recorder, deliveries, poll_interval):
+        self.base_url = base_url
+        self.dept = dept
+        self.recorder = recorder
+        self.deliveries = deliveries
+        self.poll_interval = poll_interval
+        self.http = requests.Session()
+        self.sio = socketio.Client(reconnection=True)
+        self.sio.on('new_notice', lambda data: self._on_notice(data, data['emitted_at']))
+        self.sio.on('new_notices', lambda data: [self._on_notice(n, data['emitted_at']) for n in data['notices']])
+
+    def _on_notice(self, data, emitted_at):
+        # emitted_at is the server's wall clock, so compare it with ours.
+        received = time.time()
+        with self.deliveries['lock']:
+            self.deliveries['received'][data['filename']].append((emitted_at, received))
+
+    def connect(self):
+        start = time.perf_counter()
+        self.sio.connect(self.base_url, transports=['websocket'], wait_timeout=10)
+        self.sio.emit('join', self.dept)
+        self.recorder.add('socket connect+join', time.perf_counter() - start)
+
+    def run(self, stop):
+        etag = None
+        while not stop.is_set():
+            headers = {'If-None-Match': etag} if etag else {}
+            response = self.recorder.timed('GET get_latest_notices', self.http.get,
+                                           f'{self.base_url}/get_latest_notices/{self.dept}', headers=headers, timeout=30)
+            if response is not None and response.status_code == 200:
+                etag = response.headers.get('ETag')
+                for notice in response.json()[:2]:
+                    url = notice['url'] + ('&' if '?' in notice['url'] else '?') + 'size=1080'
+                    self.recorder.timed('GET /uploads', self.http.get, self.base_url + url, timeout=30)
+            stop.wait(self.poll_interval)
+        self.sio.disconnect()
+
+def login(base_url, dept):
+    http = requests.Session()
+    http.post(f'{base_url}/department/{dept}', data={'admin_pass': f'{dept}@22'}, allow_redirects=False)
+    return http
+
+def uploader(base_url, dept, index, recorder, deliveries, pdf_pages, stop):
+    http = login(base_url, dept)
+    n = 0
+    while not stop.is_set():
+        n += 1
+        if pdf_pages and n % 5 == 0:
+            filename = f'{RUN_PREFIX}_{index}_{n}.pdf'
+            body, name = sample_pdf(pdf_pages, n), 'upload pdf'
+        else:
+            filename = f'{RUN_PREFIX}_{index}_{n}.jpg'
+            body, name = sample_image(index * 1000 + n), 'upload image'
+        # Notices name the stored blob, <sha256>.<ext>, not the uploaded file.
+        # The event can arrive before the upload's response, so register first.
+        stored = f"{hashlib.sha256(body).hexdigest()}.{filename.rsplit('.', 1)[1]}"
+        with deliveries['lock']:
+            deliveries['sent'][stored] = dept
+        recorder.timed(name, http.post, f'{base_url}/admin/{dept}',
+                       files={'file': (filename, body)}, allow_redirects=False, timeout=120)
+        stop.wait(1)
+
+def report(recorder, deliveries, displays_per_dept, duration, peaks):
+    print(f"{'operation':<26} {'count':>7} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name in sorted(recorder.samples):
+        values = recorder.samples[name]
+        print(f"{name:<26} {len(values):>7} {len(values) / duration:>8.1f} "
+              f"{statistics.median(values):>9.1f} {percentile(values, 0.99):>9.1f} {recorder.errors[name]:>7}")
+
+    # Images are published by the upload request itself; PDF pages are published
+    # as they convert, under their own filenames, so only images are matched here.
+    # The upload request itself is timed above; lag runs from the server's emit.
+    emit_lag, spread, missed = [], [], 0
+    for filename, dept in deliveries['sent'].items():
+        received = deliveries['received'].get(filename, [])
+        if not filename.endswith('.jpg'):
+            continue
+        missed += displays_per_dept[dept] - len(received)
+        if received:
+            emit_lag.extend((r - emitted) * 1000 for emitted, r in received)
+            arrivals = [r for emitted, r in received]
+            spread.append((max(arrivals) - min(arrivals)) * 1000)
+    if emit_lag:
+        print(f"emit-to-display lag       p50 {statistics.median(emit_lag):.1f} ms  p99 {percentile(emit_lag, 0.99):.1f} ms")
+        print(f"fan-out spread per notice p50 {statistics.median(spread):.1f} ms  p99 {percentile(spread, 0.99):.1f} ms")
+    print(f"notice events not delivered: {max(missed, 0)}")
+    for url, kb in sorted(peaks.items()):
+        print(f"worker {url} peak RSS {kb / 1024:.1f} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the slideshow, upload and Socket.IO paths.')
+    parser.add_argument('--clients', type=int, default=100, help='simulated slideshow displays')
+    parser.add_argument('--uploaders', type=int, help='concurrent admin uploaders (default 2, or 0 with --url)')
+    parser.add_argument('--pdf-pages', type=int, default=5, help='pages per uploaded PDF (0 disables PDFs)')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--poll-interval', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=1, help='app.py processes to start')
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--url', help='benchmark this running server instead of starting workers')
+    parser.add_argument('--allow-uploads', action='store_true',
+                        help='let --url runs upload notices, which are left on the server')
+    args = parser.parse_args()
+    if args.uploaders is None:
+        args.uploaders = 0 if args.url and not args.allow_uploads else 2
+    if args.url and args.uploaders and not args.allow_uploads:
+        parser.error('uploads to --url are not cleaned up; pass --allow-uploads to run them anyway')
+
+    DATABASE_URL = os.getenv('DATABASE_URL')
+    if not args.url and not DATABASE_URL:
+        raise Exception("DATABASE_URL environment variable not set!")
+
+    workdir = tempfile.mkdtemp(prefix='notice_load_')
+    workers = []
+    try:
+        if args.url:
+            urls = [args.url.rstrip('/')]
+        else:
+            reset_schema(DATABASE_URL)
+            workers = start_workers(DATABASE_URL, args.workers, args.port, workdir)
+            urls = [url for process, url in workers]
+
+        recorder = Recorder()
+        deliveries = {'lock': threading.Lock(), 'sent': {}, 'received': collections.defaultdict(list)}
+        stop = threading.Event()
+        displays = [Display(urls[i % len(urls)], DEPARTMENTS[i % len(DEPARTMENTS)], recorder, deliveries, args.poll_interval)
+                    for i in range(args.clients)]
+        displays_per_dept = collections.Counter(d.dept for d in displays)
+        for display in displays:
+            display.connect()
+
+        peaks = {}
+        threads = [threading.Thread(target=memory_sampler, args=(workers, peaks, stop))]
+        threads += [threading.Thread(target=d.run, args=(stop,)) for d in displays]
+        threads += [threading.Thread(target=uploader, args=(urls[0], DEPARTMENTS[i % len(DEPARTMENTS)], i,
+                                                            recorder, deliveries, args.pdf_pages, stop))
+                    for i in range(args.uploaders)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        time.sleep(args.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+        # Let in-flight events land before counting missed deliveries.
+        time.sleep(2)
+        report(recorder, deliveries, displays_per_dept, elapsed, peaks)
+    finally:
+        for process, url in workers:
+            process.terminate()
+            process.wait()
+        if workers:
+            remove_run_files(run_files(DATABASE_URL))
+            drop_schema(DATABASE_URL)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+# Query plan and latency benchmark for the notices hot queries.
+#
+# Builds a throwaway schema, fills it with synthetic notices and times every
+# hot query with and without the notices indexes the migrations add:
+#
+#   DATABASE_URL=postgres://... python benchmark_queries.py --sizes 10000 100000 1000000
+#
+# --plans prints the full EXPLAIN ANALYZE output. --seed N instead inserts N
+# sample notices into the real notices table, for trying the app locally.
+
+import os
+import argparse
+import statistics
+import time
+
+import psycopg2
+
+from migrations import migrate, MIGRATIONS
+
+BENCH_SCHEMA = 'notice_bench'
+DEPARTMENTS = ['extc', 'it', 'mech', 'cs']
+
+# admin_entries(): one page of entry heads (a PDF's pages count once), then
+# the rows of those entries. The app passes the heads to the second query as
+# arrays; here they come from a CTE so the query is self-contained.
+ADMIN_HEADS = """
+        SELECT MIN(id) AS head, MIN(document_id) AS document_id
+        FROM notices
+        WHERE department=%(dept)s AND {when} AND (%(before)s::integer IS NULL OR id < %(before)s)
+        GROUP BY COALESCE(document_id, id::text)
+        ORDER BY MIN(id) DESC
+        LIMIT 25
+"""
+ADMIN_PAGE = """
+        WITH heads AS ({heads})
+        SELECT id, department, filename, filetype, scheduled_time, expire_time, renditions, document_id, document_name,
+               original_name
+        FROM notices
+        WHERE department=%(dept)s AND {when}
+        AND (id IN (SELECT head FROM heads WHERE document_id IS NULL)
+             OR document_id IN (SELECT document_id FROM heads WHERE document_id IS NOT NULL))
+        ORDER BY id
+"""
+IMMEDIATE = "(scheduled_time IS NULL OR scheduled_time <= NOW())"
+PRESCHEDULED = "scheduled_time > NOW()"
+
+HOT_QUERIES = [
+    ('admin immediate heads', ADMIN_HEADS.format(when=IMMEDIATE)),
+    ('admin immediate page', ADMIN_PAGE.format(heads=ADMIN_HEADS.format(when=IMMEDIATE), when=IMMEDIATE)),
+    ('admin prescheduled heads', ADMIN_HEADS.format(when=PRESCHEDULED)),
+    ('admin prescheduled page', ADMIN_PAGE.format(heads=ADMIN_HEADS.format(when=PRESCHEDULED), when=PRESCHEDULED)),
+    ('active notices', """
+        SELECT id, department, filename, filetype, scheduled_time, expire_time
+        FROM notices
+        WHERE department=%(dept)s
+        AND (scheduled_time IS NULL OR scheduled_time <= NOW())
+        AND expire_time > NOW()
+        ORDER BY id DESC
+    """),
+    ('cache boundary', """
+        SELECT LEAST(
+            (SELECT MIN(scheduled_time) FROM notices
+             WHERE department=%(dept)s AND scheduled_time > NOW()),
+            (SELECT MIN(expire_time) FROM notices
+             WHERE department=%(dept)s AND expire_time > NOW())
+        )
+    """),
+    ('due broadcasts', """
+        SELECT id, department, filename, filetype, scheduled_time FROM notices
+        WHERE scheduled_time IS NOT NULL AND scheduled_time <= NOW() AND broadcasted = false
+    """),
+    ('expired sweep', """
+        SELECT id, department, filename FROM notices
+        WHERE expire_time <= NOW()
+    """),
+    ('scheduler resync', """
+        SELECT EXTRACT(EPOCH FROM (scheduled_time - NOW())), id FROM notices
+        WHERE scheduled_time IS NOT NULL AND broadcasted = false
+        AND scheduled_time <= NOW() + INTERVAL '10 minutes'
+        UNION ALL
+        SELECT EXTRACT(EPOCH FROM (expire_time - NOW())), id FROM notices
+        WHERE expire_time <= NOW() + INTERVAL '10 minutes'
+    """),
+]
+
+def generate_sample_notices(conn, count):
+    """Insert count synthetic notices shaped like a long-running deployment.
+
+    Roughly 10% are prescheduled (half still pending). The expiry sweep
+    deletes expired rows, so nearly every row expires within the next 60
+    days and only about 0.1% are already expired and waiting for the sweep.
+    PDF pages are grouped into documents of about ten pages per department.
+    """
+    c = conn.cursor()
+    c.execute("""
+        INSERT INTO notices (department, filename, filetype, scheduled_time, expire_time, broadcasted,
+                             document_id, document_name)
+        SELECT
+            (ARRAY['extc', 'it', 'mech', 'cs'])[1 + (i %% 4)],
+            'sample_' || i || '.jpg',
+            (ARRAY['pdf_image', 'pdf_image', 'pdf_image', 'jpg', 'png', 'mp4'])[1 + (i %% 6)],
+            sched,
+            CASE WHEN random() < 0.001
+                 THEN NOW() - random() * INTERVAL '1 hour'
+                 ELSE COALESCE(sched, NOW()) + random() * INTERVAL '60 days'
+            END,
+            sched IS NOT NULL AND sched <= NOW(),
+            CASE WHEN i %% 6 < 3 THEN 'sample_doc_' || (i / 120) END,
+            CASE WHEN i %% 6 < 3 THEN 'sample_' || (i / 120) || '.pdf' END
+        FROM (
+            SELECT i,
+                   CASE WHEN random() < 0.1
+                        THEN NOW() + (random() * 20 - 10) * INTERVAL '1 day'
+                   END AS sched
+            FROM generate_series(1, %s) AS i
+        ) AS rows
+    """, (count,))
+    conn.commit()
+
+def time_query(conn, sql, repeat):
+    c = conn.cursor()
+    timings = []
+    for i in range(repeat):
+        params = {'dept': DEPARTMENTS[i % len(DEPARTMENTS)], 'before': None}
+        start = time.perf_counter()
+        c.execute(sql, params)
+        c.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    conn.rollback()
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+def explain(conn, sql):
+    c = conn.cursor()
+    c.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, {'dept': 'it', 'before': None})
+    plan = [row[0] for row in c.fetchall()]
+    conn.rollback()
+    return plan
+
+def plan_summary(plan):
+    # Innermost scan nodes tell us whether an index was used.
+    scans = []
+    for line in plan:
+        text = line.strip().lstrip('-> ').split('  (')[0]
+        if 'Scan' in text and text not in scans:
+            scans.append(text)
+    return '; '.join(scans) or plan[0].split('  (')[0]
+
+def run_queries(conn, label, repeat, show_plans):
+    for name, sql in HOT_QUERIES:
+        p50, p95 = time_query(conn, sql, repeat)
+        plan = explain(conn, sql)
+        print(f"  {label:<10} {name:<26} p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  {plan_summary(plan)}")
+        if show_plans:
+            for line in plan:
+                print("      " + line)
+
+def bench_size(conn, size, repeat, show_plans):
+    c = conn.cursor()
+    c.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    c.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    c.execute(f"SET search_path TO {BENCH_SCHEMA}")
+    conn.commit()
+    # The queries need today's columns, so build the full schema and time
+    # them without, then with, the secondary indexes the migrations add.
+    migrate(conn)
+    c.execute("""
+        SELECT indexname FROM pg_indexes
+        WHERE schemaname = %s AND tablename = 'notices' AND indexname <> 'notices_pkey'
+    """, (BENCH_SCHEMA,))
+    for (index,) in c.fetchall():
+        c.execute(f"DROP INDEX {index}")
+    start = time.perf_counter()
+    generate_sample_notices(conn, size)
+    c.execute("ANALYZE notices")
+    conn.commit()
+    print(f"{size} notices (generated in {time.perf_counter() - start:.1f}s)")
+    run_queries(conn, 'no index', repeat, show_plans)
+    for version, statements in MIGRATIONS:
+        for statement in statements:
+            if 'CREATE INDEX' in statement and ' ON notices ' in statement:
+                c.execute(statement)
+    c.execute("ANALYZE notices")
+    conn.commit()
+    run_queries(conn, 'indexed', repeat, show_plans)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the notices hot queries.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--plans', action='store_true', help='print full EXPLAIN ANALYZE output')
+    parser.add_argument('--seed', type=int, metavar='N', help='insert N sample notices into the live schema and exit')
+    args = parser.parse_args()
+
+    DATABASE_URL = os.getenv('DATABASE_URL')
+    if not DATABASE_URL:
+        raise Exception("DATABASE_URL environment variable not set!")
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        if args.seed:
+            migrate(conn)
+            generate_sample_notices(conn, args.seed)
+            print(f"Inserted {args.seed} sample notices.")
+            return
+        for size in args.sizes:
+            bench_size(conn, size, args.repeat, args.plans)
+        c = conn.cursor()
+        c.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        conn.commit()
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
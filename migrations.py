@@ -0,0 +1,194 @@
+# Versioned schema migrations for the notice board database.
+#
+# Each entry is (version, [statements]). Versions are applied in order inside
+# a single transaction guarded by an advisory lock, so several gunicorn
+# workers starting at once will not race each other. Statements must stay
+# idempotent because version 1 is replayed on databases created before the
+# schema_migrations table existed.
+
+MIGRATION_LOCK_ID = 7263001
+
+MIGRATIONS = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS notices (
+            id SERIAL PRIMARY KEY,
+            department TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            filetype TEXT NOT NULL,
+            scheduled_time TIMESTAMP NULL,
+            expire_time TIMESTAMP,
+            broadcasted BOOLEAN NOT NULL DEFAULT false
+        )
+        ''',
+        "ALTER TABLE notices ADD COLUMN IF NOT EXISTS expire_time TIMESTAMP NOT NULL DEFAULT (NOW() + INTERVAL '30 days')",
+        "ALTER TABLE notices ADD COLUMN IF NOT EXISTS broadcasted BOOLEAN NOT NULL DEFAULT false",
+    ]),
+    (2, [
+        # admin() listing, public_dept() and get_latest_notices(): newest first per department.
+        "CREATE INDEX IF NOT EXISTS notices_department_id_idx ON notices (department, id DESC)",
+        # Prescheduled listing and the cache's next-scheduled boundary.
+        "CREATE INDEX IF NOT EXISTS notices_department_scheduled_idx ON notices (department, scheduled_time)",
+        # The cache's next-expiry boundary.
+        "CREATE INDEX IF NOT EXISTS notices_department_expire_idx ON notices (department, expire_time)",
+        # Scheduler resync and broadcast sweep only ever look at unbroadcast rows.
+        '''
+        CREATE INDEX IF NOT EXISTS notices_unbroadcast_scheduled_idx ON notices (scheduled_time)
+        WHERE broadcasted = false AND scheduled_time IS NOT NULL
+        ''',
+        # Scheduler resync and expiry sweep across all departments.
+        "CREATE INDEX IF NOT EXISTS notices_expire_time_idx ON notices (expire_time)",
+    ]),
+    (3, [
+        # Chunked, resumable uploads; bytes land in UPLOAD_FOLDER/<id>.part.
+        '''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            id TEXT PRIMARY KEY,
+            department TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            total_size BIGINT NOT NULL,
+            received BIGINT NOT NULL DEFAULT 0,
+            scheduled_time TIMESTAMP NULL,
+            expire_time TIMESTAMP NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        ''',
+    ]),
+    (4, [
+        # Resized/re-encoded image derivatives, e.g. {"720": ["webp", "jpg"]}.
+        "ALTER TABLE notices ADD COLUMN IF NOT EXISTS renditions JSONB NOT NULL DEFAULT '{}'::jsonb",
+    ]),
+    (5, [
+        # Per-department change feed for delta sync. The revision row is
+        # bumped inside each writing transaction, so its row lock makes
+        # revisions commit in order.
+        '''
+        CREATE TABLE IF NOT EXISTS department_revisions (
+            department TEXT PRIMARY KEY,
+            revision BIGINT NOT NULL DEFAULT 0,
+            pruned_through BIGINT NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS notice_changes (
+            department TEXT NOT NULL,
+            revision BIGINT NOT NULL,
+            notice_id INTEGER NOT NULL,
+            change TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS notice_changes_department_revision_idx ON notice_changes (department, revision)",
+    ]),
+    (6, [
+        # Socket.IO messages too large for a NOTIFY payload; pruned hourly.
+        '''
+        CREATE TABLE IF NOT EXISTS socketio_messages (
+            id BIGSERIAL PRIMARY KEY,
+            payload TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        ''',
+    ]),
+    (7, [
+        # Content-addressed upload store: one file per SHA-256, named
+        # <sha256>.<ext>, referenced by notices.filename.
+        '''
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 TEXT PRIMARY KEY,
+            filename TEXT UNIQUE NOT NULL,
+            size BIGINT NOT NULL,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        ''',
+        # Rendition reuse for duplicate uploads and legacy-file release.
+        "CREATE INDEX IF NOT EXISTS notices_filename_idx ON notices (filename)",
+    ]),
+    (8, [
+        # Departments a chunked upload is broadcast to; NULL means just its own.
+        "ALTER TABLE upload_sessions ADD COLUMN IF NOT EXISTS departments TEXT[]",
+    ]),
+    (9, [
+        # Pages converted from one PDF share its job id, so the admin
+        # listing can fold them into one entry.
+        "ALTER TABLE notices ADD COLUMN IF NOT EXISTS document_id TEXT",
+        "ALTER TABLE notices ADD COLUMN IF NOT EXISTS document_name TEXT",
+        "CREATE INDEX IF NOT EXISTS notices_document_idx ON notices (department, document_id) WHERE document_id IS NOT NULL",
+    ]),
+    (10, [
+        # Blobs are named by hash; keep the name the file was uploaded under.
+        "ALTER TABLE notices ADD COLUMN IF NOT EXISTS original_name TEXT",
+    ]),
+    (11, [
+        # PDF and video conversion jobs. Any worker may claim a queued job;
+        # a running job whose owner stops heartbeating is claimed again and
+        # resumes from pages_done. staged_path is the upload being converted.
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            department TEXT NOT NULL,
+            departments TEXT[] NOT NULL,
+            filename TEXT NOT NULL,
+            staged_path TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            size BIGINT NOT NULL,
+            scheduled_time TIMESTAMP NULL,
+            expire_time TIMESTAMP NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            pages_total INTEGER,
+            pages_done INTEGER NOT NULL DEFAULT 0,
+            notice_ids INTEGER[] NOT NULL DEFAULT '{}',
+            error TEXT,
+            owner TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+        ''',
+        # /pdf_jobs/<dept> and /video_jobs/<dept>.
+        "CREATE INDEX IF NOT EXISTS jobs_kind_department_idx ON jobs (kind, department, created_at)",
+        # Workers claiming the oldest unfinished job.
+        "CREATE INDEX IF NOT EXISTS jobs_unfinished_idx ON jobs (kind, created_at) WHERE status IN ('queued', 'running')",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(conn):
+    c = conn.cursor()
+    c.execute("SELECT to_regclass('schema_migrations')")
+    if c.fetchone()[0] is None:
+        return 0
+    c.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return c.fetchone()[0]
+
+def migrate(conn, target=LATEST_VERSION):
+    """Apply pending migrations up to target and return the list of versions applied."""
+    c = conn.cursor()
+    c.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    ''')
+    version = current_version(conn)
+    applied = []
+    for migration_version, statements in MIGRATIONS:
+        if version < migration_version <= target:
+            for statement in statements:
+                c.execute(statement)
+            c.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (migration_version,))
+            applied.append(migration_version)
+    conn.commit()
+    return applied
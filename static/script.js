@@ -40,5 +40,96 @@ document.addEventListener('DOMContentLoaded', () => {
       const modal = document.getElementById('modal');
       modal.style.display = "none";
     };
+  
+    // Large files go through the resumable chunked upload API instead of one
+    // multipart POST, so a dropped connection resumes where it stopped.
+    const CHUNKED_UPLOAD_THRESHOLD = 16 * 1024 * 1024;
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+    async function uploadStatus(sessionUrl) {
+      try {
+        const response = await fetch(sessionUrl);
+        if (response.ok) return await response.json();
+        if (response.status === 404) return null;
+      } catch (e) {}
+      return undefined;
+    }
+
+    async function chunkedUpload(form, file, status) {
+      const sessionsUrl = form.dataset.chunkedUpload;
+      const key = ['upload', sessionsUrl, file.name, file.size, file.lastModified].join(':');
+      let upload = null;
+      const savedId = localStorage.getItem(key);
+      if (savedId) {
+        upload = await uploadStatus(sessionsUrl + '/' + savedId);
+      }
+      if (!upload) {
+        const fields = {};
+        new FormData(form).forEach((value, name) => {
+          if (!(value instanceof File)) fields[name] = value;
+        });
+        fields.departments = new FormData(form).getAll('departments');
+        fields.filename = file.name;
+        fields.size = file.size;
+        const response = await fetch(sessionsUrl, {
+          method: 'POST',
+          headers: {'Content-Type': 'application/json'},
+          body: JSON.stringify(fields)
+        });
+        upload = await response.json();
+        if (!response.ok) throw new Error(upload.error);
+        localStorage.setItem(key, upload.upload_id);
+      }
+      const sessionUrl = sessionsUrl + '/' + upload.upload_id;
+      let offset = upload.offset;
+      while (offset < file.size) {
+        status.textContent = 'Uploading ' + file.name + ': ' + Math.floor(offset * 100 / file.size) + '%';
+        try {
+          const response = await fetch(sessionUrl + '?offset=' + offset, {
+            method: 'PUT',
+            headers: {'Content-Type': 'application/octet-stream'},
+            body: file.slice(offset, offset + upload.chunk_size)
+          });
+          const body = await response.json();
+          if (!response.ok && response.status !== 409) throw new Error(body.error);
+          offset = body.offset;
+        } catch (e) {
+          // Network blip: wait, then ask the server how much it actually kept.
+          status.textContent = 'Connection lost, retrying...';
+          await sleep(3000);
+          const current = await uploadStatus(sessionUrl);
+          if (current === null) {
+            localStorage.removeItem(key);
+            throw new Error('Upload expired on the server. Please start again.');
+          }
+          if (current) offset = current.offset;
+        }
+      }
+      status.textContent = 'Processing ' + file.name + '...';
+      const response = await fetch(sessionUrl + '/finalize', {method: 'POST'});
+      const body = await response.json();
+      localStorage.removeItem(key);
+      if (!response.ok) throw new Error(body.error);
+    }
+
+    document.querySelectorAll('form[data-chunked-upload]').forEach(form => {
+      form.addEventListener('submit', event => {
+        const file = form.querySelector('input[type=file]').files[0];
+        if (!file || file.size < CHUNKED_UPLOAD_THRESHOLD) return;
+        event.preventDefault();
+        let status = form.querySelector('.upload-status');
+        if (!status) {
+          status = document.createElement('div');
+          status.className = 'upload-status';
+          form.appendChild(status);
+        }
+        form.querySelector('input[type=submit]').disabled = true;
+        chunkedUpload(form, file, status)
+          .then(() => { window.location = form.dataset.redirect; })
+          .catch(error => {
+            status.textContent = 'Upload failed: ' + error.message;
+            form.querySelector('input[type=submit]').disabled = false;
+          });
+      });
+    });
   });
-  
\ No newline at end of file
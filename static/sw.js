@@ -0,0 +1,180 @@
+// Slideshow service worker: keeps every active notice's media in Cache Storage
+// so rotations are served locally and the slideshow keeps running while the
+// server or network is down. Pages post the department manifest after each
+// load ({type: 'sync'}) and the filenames of deleted notices ({type: 'evict'}).
+const MEDIA_CACHE = 'notice-media-v1';
+const SHELL_CACHE = 'notice-shell-v1';
+const MANIFEST_CACHE = 'notice-manifests-v1';
+const PREFETCH_CONCURRENCY = 3;
+const SHELL_ASSETS = [
+  '/static/styles.css',
+  '/static/script.js',
+  'https://cdn.socket.io/4.6.0/socket.io.min.js'
+];
+
+self.addEventListener('install', event => {
+  event.waitUntil(caches.open(SHELL_CACHE)
+    .then(cache => Promise.all(SHELL_ASSETS.map(url => cache.add(new Request(url, {mode: 'no-cors'})).catch(() => {}))))
+    .then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', event => {
+  const current = [MEDIA_CACHE, SHELL_CACHE, MANIFEST_CACHE];
+  event.waitUntil(caches.keys()
+    .then(names => Promise.all(names.filter(name => !current.includes(name)).map(name => caches.delete(name))))
+    .then(() => self.clients.claim()));
+});
+
+self.addEventListener('message', event => {
+  const data = event.data || {};
+  if (data.type === 'sync') {
+    event.waitUntil(syncDepartment(data.department, data.manifest));
+  } else if (data.type === 'evict') {
+    event.waitUntil(evictFilenames(new Set(data.filenames)));
+  }
+});
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+  if (url.origin === self.location.origin && url.pathname.startsWith('/uploads/')) {
+    event.respondWith(cachedMedia(request));
+  } else if (request.mode === 'navigate' || SHELL_ASSETS.includes(url.href) || SHELL_ASSETS.includes(url.pathname)) {
+    event.respondWith(networkFirst(request));
+  }
+});
+
+// Media URLs carry a content hash, so a cached copy never goes stale.
+async function cachedMedia(request) {
+  const cache = await caches.open(MEDIA_CACHE);
+  // /uploads negotiates image formats on Accept; any cached variant will do.
+  const cached = await cache.match(request.url, {ignoreVary: true});
+  if (cached) {
+    const range = request.headers.get('Range');
+    return range ? rangeResponse(cached, range) : cached;
+  }
+  const response = await fetch(request);
+  if (cacheable(response)) {
+    cache.put(request.url, response.clone()).catch(() => {});
+  }
+  return response;
+}
+
+// A ?size= request answered with the original (rendition not built yet) is
+// marked no-cache by the server; keep only what it says will never change.
+function cacheable(response) {
+  if (response.status !== 200) return false;
+  const url = new URL(response.url);
+  return !url.searchParams.has('size') || (response.headers.get('Cache-Control') || '').includes('immutable');
+}
+
+// Video elements ask for byte ranges; answer them from the cached full body.
+async function rangeResponse(response, range) {
+  const body = await response.blob();
+  const match = /bytes=(\d*)-(\d*)/.exec(range);
+  if (!match) return response;
+  let start = match[1] === '' ? null : parseInt(match[1], 10);
+  let end = match[2] === '' ? body.size - 1 : Math.min(parseInt(match[2], 10), body.size - 1);
+  if (start === null) {
+    start = Math.max(body.size - parseInt(match[2], 10), 0);
+    end = body.size - 1;
+  }
+  if (start >= body.size) {
+    return new Response(null, {status: 416, headers: {'Content-Range': `bytes */${body.size}`}});
+  }
+  return new Response(body.slice(start, end + 1), {
+    status: 206,
+    headers: {
+      'Content-Type': response.headers.get('Content-Type') || body.type,
+      'Content-Length': String(end - start + 1),
+      'Content-Range': `bytes ${start}-${end}/${body.size}`,
+      'Accept-Ranges': 'bytes'
+    }
+  });
+}
+
+// The slideshow page and its assets: fresh when the server answers, cached when it doesn't.
+// Only shell assets are stored here; slideshow pages are stored by syncDepartment(),
+// so no other page (admin, login) ever lands in the cache.
+async function networkFirst(request) {
+  const cache = await caches.open(SHELL_CACHE);
+  try {
+    const response = await fetch(request);
+    if (request.mode !== 'navigate' && (response.ok || response.type === 'opaque')) {
+      cache.put(request, response.clone()).catch(() => {});
+    }
+    if (response.status < 500) return response;
+    return (await cache.match(request)) || response;
+  } catch (e) {
+    const cached = await cache.match(request);
+    if (cached) return cached;
+    throw e;
+  }
+}
+
+function itemUrls(item) {
+  let urls = [item.src];
+  if (item.srcset) urls = urls.concat(item.srcset.split(',').map(candidate => candidate.trim().split(' ')[0]));
+  if (item.poster) urls.push(item.poster);
+  return urls.map(url => new URL(url, self.location.origin).href);
+}
+
+async function syncDepartment(department, manifest) {
+  const manifests = await caches.open(MANIFEST_CACHE);
+  await manifests.put('/manifest/' + department, new Response(JSON.stringify(manifest)));
+  try {
+    // Without cookies, so the copy is the shared page and doesn't consume anyone's flash messages.
+    const page = await fetch('/' + department, {credentials: 'omit'});
+    if (page.ok) await (await caches.open(SHELL_CACHE)).put(new URL('/' + department, self.location.origin).href, page);
+  } catch (e) {}
+  const cache = await caches.open(MEDIA_CACHE);
+  const wanted = [];
+  for (const item of manifest.media) {
+    for (const url of itemUrls(item)) {
+      if (!wanted.includes(url) && !(await cache.match(url, {ignoreVary: true}))) wanted.push(url);
+    }
+  }
+  // A few downloads at a time so a big backlog doesn't starve the live slides.
+  async function prefetch() {
+    while (wanted.length) {
+      const url = wanted.shift();
+      try {
+        const response = await fetch(url, {headers: {Accept: 'image/avif,image/webp,*/*'}});
+        if (cacheable(response)) await cache.put(url, response);
+      } catch (e) {}
+    }
+  }
+  await Promise.all(Array.from({length: PREFETCH_CONCURRENCY}, prefetch));
+  await pruneMedia();
+}
+
+// Everything cached for a notice (renditions, segments, poster) starts with /uploads/<filename>.
+function ownedBy(url, filenames) {
+  const path = new URL(url).pathname;
+  if (!path.startsWith('/uploads/')) return false;
+  const name = decodeURIComponent(path.slice('/uploads/'.length));
+  for (const filename of filenames) {
+    if (name === filename || name.startsWith(filename + '.')) return true;
+  }
+  return false;
+}
+
+async function evictFilenames(filenames) {
+  const cache = await caches.open(MEDIA_CACHE);
+  const requests = await cache.keys();
+  await Promise.all(requests.filter(request => ownedBy(request.url, filenames)).map(request => cache.delete(request)));
+}
+
+// Drop media no department this worker serves still shows.
+async function pruneMedia() {
+  const manifests = await caches.open(MANIFEST_CACHE);
+  const active = new Set();
+  for (const request of await manifests.keys()) {
+    const manifest = await (await manifests.match(request)).json();
+    manifest.media.forEach(item => active.add(item.filename));
+  }
+  const cache = await caches.open(MEDIA_CACHE);
+  const requests = await cache.keys();
+  await Promise.all(requests.filter(request => !ownedBy(request.url, active)).map(request => cache.delete(request)));
+}